@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Compares two node2vec models (e.g. two periods, or the AGDT and the PROIEL model) over their whole shared vocabulary
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+The second model is rotated onto the first with orthogonal Procrustes over the lemmas they share. For every shared
+lemma we then compute:
+    - drift: cosine distance between its vector in the first model and its aligned vector in the second
+    - overlap: share of its top-k nearest neighbours (within the shared vocabulary) the two models have in common
+Neighbours are computed with blocked matrix products, so the full lexicon takes seconds rather than one
+most_similar() call per lemma and model.
+
+How to run:
+    $ python compare_models.py ./outputs/archaic/min5-n2v-model.txt ./outputs/classical/min5-n2v-model.txt
+
+Returns:
+    A tab-separated report (by default drift-<folder1>-<folder2>.tsv next to the first model) with one row per shared
+    lemma, sorted by decreasing drift: lemma, drift, overlap, neighbours in model 1, neighbours in model 2.
+"""
+
+import argparse
+import os
+
+from gensim.models import KeyedVectors
+import numpy as np
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def procrustes(source, target):
+    """Orthogonal matrix R minimising ||source @ R - target|| (both row-aligned)."""
+    u, _, vt = np.linalg.svd(source.T @ target)
+    return u @ vt
+
+
+def top_neighbours(vectors, topn, block=1024):
+    """Indices of the topn nearest neighbours (by cosine) of every row, excluding itself, most similar first."""
+    neighbours = np.empty((len(vectors), topn), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        sims = vectors[start:start + block] @ vectors.T
+        rows = np.arange(sims.shape[0])
+        sims[rows, rows + start] = -np.inf
+        top = np.argpartition(-sims, topn, axis=1)[:, :topn]
+        order = np.argsort(-sims[rows[:, None], top], axis=1)
+        neighbours[start:start + block] = top[rows[:, None], order]
+    return neighbours
+
+
+def neighbour_overlap(first, second, block=1024):
+    """Share of common entries between the rows of two neighbour matrices."""
+    overlap = np.empty(len(first), dtype=np.float64)
+    for start in range(0, len(first), block):
+        a = first[start:start + block]
+        b = second[start:start + block]
+        overlap[start:start + block] = (a[:, :, None] == b[:, None, :]).any(axis=2).sum(axis=1) / first.shape[1]
+    return overlap
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Align two node2vec models and rank lemmas by drift')
+    parser.add_argument('model1', help='vectors saved by train.py (.txt, word2vec format)')
+    parser.add_argument('model2', help='vectors saved by train.py (.txt, word2vec format)')
+    parser.add_argument('--topn', type=int, default=15, help='number of neighbours compared per lemma')
+    parser.add_argument('--block', type=int, default=1024, help='rows per block in the similarity products')
+    parser.add_argument('--out', help='path of the tab-separated report')
+    args = parser.parse_args()
+
+    wv1 = KeyedVectors.load_word2vec_format(args.model1, binary=False)
+    wv2 = KeyedVectors.load_word2vec_format(args.model2, binary=False)
+
+    shared = [lemma for lemma in wv1.index_to_key if lemma in wv2.key_to_index]
+    if len(shared) <= args.topn:
+        raise ValueError('The two models share only {} lemmas, not enough for {} neighbours'.format(len(shared), args.topn))
+    print('{} shared lemmas ({} only in model 1, {} only in model 2)'.format(
+        len(shared), len(wv1) - len(shared), len(wv2) - len(shared)))
+
+    a = normalize(wv1.vectors[[wv1.key_to_index[lemma] for lemma in shared]].astype(np.float32))
+    b = normalize(wv2.vectors[[wv2.key_to_index[lemma] for lemma in shared]].astype(np.float32))
+    b = b @ procrustes(b, a) # rotations keep norms, so b stays unit length
+
+    drift = 1 - np.einsum('ij,ij->i', a, b)
+    # Neighbour lists within each model do not depend on the rotation, but are restricted to the shared lemmas
+    neighbours1 = top_neighbours(a, args.topn, args.block)
+    neighbours2 = top_neighbours(b, args.topn, args.block)
+    overlap = neighbour_overlap(neighbours1, neighbours2, args.block)
+
+    out = args.out
+    if out is None:
+        # train.py gives every model the same file name, so models are named after their folder
+        name1 = os.path.basename(os.path.dirname(os.path.abspath(args.model1)))
+        name2 = os.path.basename(os.path.dirname(os.path.abspath(args.model2)))
+        out = os.path.join(os.path.dirname(args.model1), 'drift-{}-{}.tsv'.format(name1, name2))
+    with open(out, 'w') as outtxt:
+        outtxt.write('lemma\tdrift\toverlap\tneighbours1\tneighbours2\n')
+        for i in np.argsort(-drift, kind='stable'):
+            outtxt.write('{}\t{:.4f}\t{:.4f}\t{}\t{}\n'.format(
+                shared[i], drift[i], overlap[i],
+                ' '.join(shared[j] for j in neighbours1[i]), ' '.join(shared[j] for j in neighbours2[i])))
+    print('Report written to {}'.format(out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Batch evaluation of trained node2vec models on similarity, analogy and neighbour gold sets
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+Every model is loaded and normalized once, and each kind of gold set is scored for all its items at once with matrix
+products (in blocks of rows), so sets of thousands of items take seconds. Lemmas are normalized like the vocabulary
+(Unicode NFC). Items with a lemma missing from the model are skipped and counted in 'found'.
+
+Gold sets (tab- or space-separated text files, lines starting with # are ignored):
+    --similarity: 'lemma1 lemma2 score' per line (similarity or relatedness judgements). Scored by Spearman's and
+                  Pearson's correlation between the scores and the cosine similarities.
+    --analogies:  'a b c d' per line (a is to b as c is to d), optionally grouped under ': section' lines as in the
+                  word2vec questions-words.txt. Scored by accuracy: d must be the nearest lemma to b - a + c, leaving
+                  out a, b and c (3CosAdd).
+    --neighbours: 'lemma neighbour1 neighbour2 ...' per line. Scored by the share of the gold neighbours among the
+                  lemma's top-n neighbours in the model (recall) and the share of the top-n that are gold (precision).
+Each option can be given several times; a set is named after its file.
+
+How to run:
+    $ python evaluate.py ./outputs/*/min5-n2v-model.txt --similarity simlex-grc.tsv --analogies analogies-grc.txt
+
+Returns (in the folder of each model):
+    evaluation.json (file): the scores of every gold set, to compare runs
+    evaluation-<kind>-<set>.tsv (file): the model's answer for every item of the set, e.g.
+                                        evaluation-similarity-simlex-grc.tsv
+"""
+
+import argparse
+import json
+import os
+
+from gensim.models import KeyedVectors
+import numpy as np
+
+from compare_models import normalize
+import lemmas
+
+
+def read_set(path, min_fields):
+    """Lines of a gold set file as lists of fields (lemmas NFC-normalized), with the ': section' of each line."""
+    items = []
+    section = None
+    with open(path, 'r') as intxt:
+        for n, line in enumerate(intxt.readlines(), 1):
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            if line.startswith(':'):
+                section = line[1:].strip()
+                continue
+            fields = lemmas.normalize(line).split()
+            if len(fields) < min_fields:
+                raise ValueError('{}, line {}: expected at least {} fields, got {!r}'.format(path, n, min_fields, line))
+            items.append((section, fields))
+    return items
+
+
+def lookup(wv, lemmas):
+    """Row of every lemma in wv (-1 if missing)."""
+    return np.array([wv.key_to_index.get(lemma, -1) for lemma in lemmas], dtype=np.int64).reshape(-1)
+
+
+def nearest(queries, vectors, topn, exclude=None, block=1024):
+    """
+    Rows of vectors (unit length) with the highest cosine similarity to every query, most similar first.
+    exclude: one row of indices of vectors per query to leave out (-1 for none).
+    """
+    out = np.empty((len(queries), topn), dtype=np.int64)
+    for start in range(0, len(queries), block):
+        sims = queries[start:start + block] @ vectors.T
+        if exclude is not None:
+            skip = exclude[start:start + block]
+            rows, cols = np.nonzero(skip >= 0)
+            sims[rows, skip[rows, cols]] = -np.inf
+        rows = np.arange(sims.shape[0])[:, None]
+        top = np.argpartition(-sims, topn - 1, axis=1)[:, :topn]
+        out[start:start + block] = top[rows, np.argsort(-sims[rows, top], axis=1)]
+    return out
+
+
+def _ranks(x):
+    """Ranks of x, tied values getting the average of their ranks."""
+    ranks = np.empty(len(x))
+    ranks[np.argsort(x, kind='stable')] = np.arange(len(x))
+    _, inverse, counts = np.unique(x, return_inverse=True, return_counts=True)
+    return (np.bincount(inverse, weights=ranks) / counts)[inverse]
+
+
+def _pearson(x, y):
+    x = x - x.mean()
+    y = y - y.mean()
+    denominator = np.sqrt((x ** 2).sum() * (y ** 2).sum())
+    return float((x * y).sum() / denominator) if denominator > 0 else None
+
+
+def score_similarity(wv, vectors, items):
+    pairs = [fields for _, fields in items]
+    a = lookup(wv, [p[0] for p in pairs])
+    b = lookup(wv, [p[1] for p in pairs])
+    gold = np.array([float(p[2]) for p in pairs])
+    found = (a >= 0) & (b >= 0)
+    cosines = np.full(len(pairs), np.nan)
+    cosines[found] = np.einsum('ij,ij->i', vectors[a[found]], vectors[b[found]])
+
+    summary = {'items': len(pairs), 'found': int(found.sum()), 'spearman': None, 'pearson': None}
+    if found.sum() > 1:
+        summary['spearman'] = _pearson(_ranks(gold[found]), _ranks(cosines[found]))
+        summary['pearson'] = _pearson(gold[found], cosines[found])
+    rows = [[p[0], p[1], p[2], '{:.4f}'.format(c) if f else ''] for p, c, f in zip(pairs, cosines, found)]
+    return summary, ['lemma1', 'lemma2', 'gold', 'cosine'], rows
+
+
+def score_analogies(wv, vectors, items, block):
+    questions = [fields[:4] for _, fields in items]
+    sections = [section for section, _ in items]
+    rows4 = lookup(wv, [lemma for q in questions for lemma in q]).reshape(-1, 4)
+    found = (rows4 >= 0).all(axis=1)
+
+    predicted = np.full(len(questions), -1, dtype=np.int64)
+    if found.any():
+        a, b, c, _ = rows4[found].T
+        queries = normalize(vectors[b] - vectors[a] + vectors[c])
+        predicted[found] = nearest(queries, vectors, 1, np.stack([a, b, c], axis=1), block)[:, 0]
+    correct = found & (predicted == rows4[:, 3])
+
+    summary = {'items': len(questions), 'found': int(found.sum()),
+               'accuracy': float(correct[found].mean()) if found.any() else None, 'sections': {}}
+    for section in dict.fromkeys(sections):
+        mask = found & np.array([s == section for s in sections])
+        summary['sections'][str(section)] = {'found': int(mask.sum()),
+                                             'accuracy': float(correct[mask].mean()) if mask.any() else None}
+    rows = [q + [wv.index_to_key[p] if p >= 0 else '', str(bool(ok))] for q, p, ok in zip(questions, predicted, correct)]
+    return summary, ['a', 'b', 'c', 'd', 'predicted', 'correct'], rows
+
+
+def score_neighbours(wv, vectors, items, topn, block):
+    lemmas = [fields[0] for _, fields in items]
+    rows = lookup(wv, lemmas)
+    found = rows >= 0
+
+    predicted = np.full((len(lemmas), topn), -1, dtype=np.int64)
+    if found.any():
+        predicted[found] = nearest(vectors[rows[found]], vectors, topn, rows[found][:, None], block)
+    recall = np.full(len(lemmas), np.nan)
+    precision = np.full(len(lemmas), np.nan)
+    for i in np.flatnonzero(found):
+        gold = lookup(wv, items[i][1][1:])
+        gold = gold[gold >= 0]
+        hits = np.isin(predicted[i], gold).sum()
+        precision[i] = hits / topn
+        recall[i] = hits / len(gold) if len(gold) != 0 else np.nan
+
+    summary = {'items': len(lemmas), 'found': int(found.sum()), 'topn': topn,
+               'precision': float(np.nanmean(precision)) if found.any() else None,
+               'recall': float(np.nanmean(recall)) if not np.isnan(recall).all() else None}
+    out = [[lemma, '{:.4f}'.format(p) if f else '', '{:.4f}'.format(r) if not np.isnan(r) else '',
+            ' '.join(wv.index_to_key[j] for j in predicted[i]) if f else '']
+           for i, (lemma, p, r, f) in enumerate(zip(lemmas, precision, recall, found))]
+    return summary, ['lemma', 'precision', 'recall', 'neighbours'], out
+
+
+def _set_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def evaluate(path, sets, topn, block):
+    """Score the model at path on every gold set; write the results next to it and return the summary."""
+    wv = KeyedVectors.load_word2vec_format(path, binary=False)
+    vectors = normalize(wv.vectors.astype(np.float32))
+    folder = os.path.dirname(os.path.abspath(path))
+    if any(kind == 'neighbours' for kind, _, _ in sets) and len(wv) <= topn:
+        raise ValueError('{} has only {} lemmas, not enough for {} neighbours'.format(path, len(wv), topn))
+
+    results = {'model': path, 'lemmas': len(wv), 'similarity': {}, 'analogies': {}, 'neighbours': {}}
+    for kind, name, items in sets:
+        if kind == 'similarity':
+            summary, header, rows = score_similarity(wv, vectors, items)
+        elif kind == 'analogies':
+            summary, header, rows = score_analogies(wv, vectors, items, block)
+        else:
+            summary, header, rows = score_neighbours(wv, vectors, items, topn, block)
+        results[kind][name] = summary
+        with open(os.path.join(folder, 'evaluation-{}-{}.tsv'.format(kind, name)), 'w') as outtxt:
+            outtxt.write('\t'.join(header) + '\n')
+            outtxt.writelines('\t'.join(row) + '\n' for row in rows)
+
+    with open(os.path.join(folder, 'evaluation.json'), 'w') as outtxt:
+        json.dump(results, outtxt, indent=2, ensure_ascii=False)
+    return results
+
+
+def _fmt(value):
+    return '-' if value is None else '{:.4f}'.format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score node2vec models on similarity, analogy and neighbour gold sets')
+    parser.add_argument('models', nargs='+', help='vectors saved by train.py (.txt, word2vec format)')
+    parser.add_argument('--similarity', action='append', default=[], help='similarity/relatedness list')
+    parser.add_argument('--analogies', action='append', default=[], help='analogy questions')
+    parser.add_argument('--neighbours', action='append', default=[], help='gold neighbour sets')
+    parser.add_argument('--topn', type=int, default=10, help='neighbours compared per lemma in the neighbour sets')
+    parser.add_argument('--block', type=int, default=1024, help='queries per block in the similarity products')
+    args = parser.parse_args()
+
+    # Read the gold sets once for all models
+    sets = [('similarity', _set_name(p), read_set(p, 3)) for p in args.similarity] + \
+           [('analogies', _set_name(p), read_set(p, 4)) for p in args.analogies] + \
+           [('neighbours', _set_name(p), read_set(p, 2)) for p in args.neighbours]
+    if len(sets) == 0:
+        parser.error('give at least one of --similarity, --analogies or --neighbours')
+
+    for path in args.models:
+        results = evaluate(path, sets, args.topn, args.block)
+        print('\n{} ({} lemmas)'.format(path, results['lemmas']))
+        for name, s in results['similarity'].items():
+            print('    {:<24} spearman {}  ({}/{} pairs)'.format(name, _fmt(s['spearman']), s['found'], s['items']))
+        for name, s in results['analogies'].items():
+            print('    {:<24} accuracy {}  ({}/{} questions)'.format(name, _fmt(s['accuracy']), s['found'], s['items']))
+        for name, s in results['neighbours'].items():
+            print('    {:<24} precision@{} {}  recall {}  ({}/{} lemmas)'.format(
+                name, s['topn'], _fmt(s['precision']), _fmt(s['recall']), s['found'], s['items']))
+
+
+if __name__ == '__main__':
+    main()
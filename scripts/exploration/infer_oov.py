@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Vectors for lemmas missing from a trained model, from their neighbours in new parenthetical trees (no retraining)
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+The new trees (e.g. the outparenth-*.txt of newly annotated texts) are turned into edges the same way train.py builds
+the supergraph. Every lemma that is not in the model gets the average of the vectors of its neighbours, weighted by
+how often they are linked. Lemmas whose neighbours are all unseen too get their vectors in the following rounds, from
+the neighbours inferred before them. The empty node NLTK links every leaf to is left out, since it would pull all
+leaves towards the same point. The trained vectors themselves are not changed.
+
+How to use (e.g. from most_similar.py):
+    from infer_oov import add_oov
+    added = add_oov(w2vmodel, open('./outputs/newtexts/outparenth-agdt.txt').readlines())
+
+or from the command line, to save the model with the new vectors added:
+    $ python infer_oov.py ./outputs/modelname/min5-n2v-model.txt ./outputs/newtexts/outparenth-agdt.txt out.txt
+"""
+
+import argparse
+from collections import Counter, defaultdict
+
+from gensim.models import KeyedVectors
+from nltk import Tree
+import numpy as np
+
+from lemmas import normalize, tree2edges
+
+ROUNDS = 3 # How many steps away from a known lemma an unseen lemma can be and still get a vector
+
+
+def neighbours(trees):
+    """Lemma -> Counter of its neighbours in the given parenthetical trees (lemmas normalized like the vocabulary)."""
+    graph = defaultdict(Counter)
+    for line in trees:
+        if line.strip() == '':
+            continue
+        for head, dep in tree2edges(Tree.fromstring(line)):
+            head, dep = normalize(head), normalize(dep)
+            if head == '' or dep == '' or head == dep:
+                continue
+            graph[head][dep] += 1
+            graph[dep][head] += 1
+    return graph
+
+
+def oov_vectors(wv, trees, rounds=ROUNDS):
+    """Inferred vectors (lemma -> vector) for the lemmas of the trees missing from wv (KeyedVectors)."""
+    graph = neighbours(trees)
+    inferred = {}
+    pending = [lemma for lemma in graph if lemma not in wv.key_to_index]
+    for _ in range(rounds):
+        found = {}
+        for lemma in pending:
+            known = [(n, c) for n, c in graph[lemma].items() if n in wv.key_to_index or n in inferred]
+            if len(known) == 0:
+                continue
+            weights = np.array([c for _, c in known], dtype=np.float32)
+            vectors = np.stack([wv.vectors[wv.key_to_index[n]] if n in wv.key_to_index else inferred[n]
+                                for n, _ in known])
+            found[lemma] = weights @ vectors / weights.sum()
+        if len(found) == 0:
+            break
+        # Only use a round's vectors in the next round, so the result does not depend on the order of the lemmas
+        inferred.update(found)
+        pending = [lemma for lemma in pending if lemma not in found]
+    return inferred
+
+
+def add_oov(wv, trees, rounds=ROUNDS):
+    """Add inferred vectors for the unseen lemmas of the trees to wv; return the lemmas added."""
+    inferred = oov_vectors(wv, trees, rounds)
+    if len(inferred) != 0:
+        wv.add_vectors(list(inferred), np.stack(list(inferred.values())))
+        # Models read with load_word2vec_format carry a 'count' per key, which add_vectors does not extend, and
+        # save_word2vec_format would fail on the new keys
+        wv.allocate_vecattrs()
+        wv.fill_norms(force=True) # most_similar() would otherwise use stale norms
+    return list(inferred)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add vectors for unseen lemmas from their neighbours in new trees')
+    parser.add_argument('model', help='vectors saved by train.py (.txt, word2vec format)')
+    parser.add_argument('trees', help='file with one parenthetical tree per line')
+    parser.add_argument('out', help='where to save the vectors with the new lemmas added (.txt, word2vec format)')
+    parser.add_argument('--rounds', type=int, default=ROUNDS)
+    args = parser.parse_args()
+
+    wv = KeyedVectors.load_word2vec_format(args.model, binary=False)
+    with open(args.trees, 'r') as intxt:
+        added = add_oov(wv, intxt.readlines(), args.rounds)
+    print('Added {} lemmas'.format(len(added)))
+    wv.save_word2vec_format(args.out, binary=False)
+
+    # Read the saved model back, so a file that most_similar.py or evaluate.py cannot load is caught here
+    saved = KeyedVectors.load_word2vec_format(args.out, binary=False)
+    keys = wv.index_to_key
+    if set(saved.index_to_key) != set(keys) or not np.allclose(saved[keys], wv.vectors, atol=1e-5):
+        raise ValueError('{} does not read back as the vectors that were saved'.format(args.out))
+
+
+if __name__ == '__main__':
+    main()
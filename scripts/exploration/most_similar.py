@@ -4,9 +4,21 @@
 from gensim.models import KeyedVectors
 from gensim.test.utils import datapath
 
+from infer_oov import add_oov
+
 # Change following to path to your vectors (ending in 'model.txt')
 w2vmodel = KeyedVectors.load_word2vec_format(datapath("./outputs/final_graph_all/win1-min1-n2v-vectors.txt"),binary=False)
 
+# Lemmas missing from the model (e.g. only found in newly annotated texts) can be given vectors from their neighbours
+# in the new parenthetical trees, without retraining (see infer_oov.py). Change the following to the path to the new
+# trees (an outparenth-*.txt file) to use it.
+NEW_TREES = None
+
+if NEW_TREES is not None:
+    with open(NEW_TREES, 'r') as intxt:
+        added = add_oov(w2vmodel, intxt.readlines())
+    print('{} lemmas added from {}'.format(len(added), NEW_TREES))
+
 # Add any words to find 15 most similar
 # See normal gensim-implemented operations here: https://radimrehurek.com/gensim/models/keyedvectors.html
 
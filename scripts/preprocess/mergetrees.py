@@ -15,20 +15,48 @@ Before running this script, you need to:
     - have run xml-to-parenth-agdt.py and xml-to-parenth-proiel.py as appropriate
 
 Returns:
-    ./outputs/nameofmodel/trees.txt (file): contains merged outparenth-proiel/agdt.txt files
+    ./outputs/nameofmodel/trees.txt (file): contains merged outparenth-proiel/agdt.txt files (or their .txt.gz versions)
+    ./outputs/nameofmodel/sources.txt (file): source .xml file of each line in trees.txt (merged outsource-proiel/agdt.txt),
+                                              used by train.py to split the trees into subcorpora
     
 
 """
 
 from glob import glob
+import os
+
+from writers import open_text
+
+
+def complete_lines(intxt):
+    """The lines of intxt, without a last line cut short (no line break) by a converter killed while writing it."""
+    lines = intxt.readlines()
+    if len(lines) != 0 and not lines[-1].endswith('\n'):
+        lines.pop()
+    return lines
+
 
 modelname = input('Enter name of model (i.e. name of folder with preprocessed texts: ')
 
 finaltrees = open('./outputs/{}/trees.txt'.format(modelname), 'w')
+finalsources = open('./outputs/{}/sources.txt'.format(modelname), 'w')
 
-alltrees = glob('./outputs/{}/outparenth*.txt'.format(modelname))
+alltrees = glob('./outputs/{}/outparenth*.txt'.format(modelname)) + glob('./outputs/{}/outparenth*.txt.gz'.format(modelname))
 
 for tree in alltrees:
-    with open(tree, 'r') as intxt:
-        for line in intxt.readlines():
-            finaltrees.write(line)
+    with open_text(tree, 'r') as intxt:
+        lines = complete_lines(intxt)
+    source = os.path.join(os.path.dirname(tree), os.path.basename(tree).replace('outparenth', 'outsource'))
+    if os.path.exists(source):
+        with open_text(source, 'r') as intxt:
+            sources = complete_lines(intxt)
+        # A converter killed while flushing may have written one file further than the other (see writers.py): keep
+        # the lines both have, so the two files stay aligned
+        lines, sources = lines[:len(sources)], sources[:len(lines)]
+    else: # trees converted before sources were recorded: keep the two files aligned with empty lines
+        sources = ['\n'] * len(lines)
+    finaltrees.writelines(lines)
+    finalsources.writelines(sources)
+
+finaltrees.close()
+finalsources.close()
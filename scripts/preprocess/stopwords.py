@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Ancient Greek stop-words removed from the parenthetical trees
+--------------------
+
+Shared by xml-to-parenth-agdt.py, xml-to-parenth-proiel.py and tokens-to-parenth.py.
+"""
+
+# The list of stop-words, compiled by Alessandro Vatri based on the Perseus Hopper source, is available at https://figshare.com/articles/Ancient_Greek_stop_words/9724613.
+# This list comes from the Perseus Hopper source [http://sourceforge.net/projects/perseus-hopper],
+# found at "/sgml/reading/build/stoplists", though this only contained acute accents on the ultima.
+# There has been added to this grave accents to the ultima of each.
+# Perseus source is made available under the Mozilla Public License 1.1 (MPL 1.1) [http://www.mozilla.org/MPL/1.1/].
+# 	__author__ = ['Kyle P. Johnson <kyle@kyle-p-johnson.com>']
+# 	__license__ = 'GPL License.'
+# Vatri: added support for tonos vs oxia acute accent
+# Martina Astrid Rodda: added 'None'
+# Nilo Pedrazzini added λέγω,'εἰμί#1','καί#1','οὕτω(ς)','γίγνομαι','ἔχω','εἰ#1',ὅτι#1, νῦν#1, νῦν, εἰς
+
+
+STOPS_LIST = ['αὐτὸς',
+            'αὐτός',
+            'γε',
+            'γὰρ',
+            'γάρ',
+            "δ'",
+            'δαὶ',
+            'δαὶς',
+            'δαί',
+            'δαίς',
+            'διὰ',
+            'διά',
+            'δὲ',
+            'δέ',
+            'δὴ',
+            'δή',
+            'εἰ',
+            'εἰμὶ',
+            'εἰμί',
+            'εἰς',
+            'εἴμι',
+            'κατὰ',
+            'κατά',
+            'καὶ',
+            'καί',
+            'μετὰ',
+            'μετά',
+            'μὲν',
+            'μέν',
+            'μὴ',
+            'μή',
+            'οἱ',
+            'οὐ',
+            'οὐδεὶς',
+            'οὐδείς',
+            'οὐδὲ',
+            'οὐδέ',
+            'οὐκ',
+            'οὔτε',
+            'οὕτως',
+            'οὖν',
+            'οὗτος',
+            'παρὰ',
+            'παρά',
+            'περὶ',
+            'περί',
+            'πρὸς',
+            'πρός',
+            'σὸς',
+            'σός',
+            'σὺ',
+            'σὺν',
+            'σύ',
+            'σύν',
+            'τε',
+            'τι',
+            'τις',
+            'τοιοῦτος',
+            'τοὶ',
+            'τοί',
+            'τοὺς',
+            'τούς',
+            'τοῦ',
+            'τὰ',
+            'τά',
+            'τὴν',
+            'τήν',
+            'τὶ',
+            'τὶς',
+            'τί',
+            'τίς',
+            'τὸ',
+            'τὸν',
+            'τό',
+            'τόν',
+            'τῆς',
+            'τῇ',
+            'τῶν',
+            'τῷ',
+            "ἀλλ'",
+            'ἀλλὰ',
+            'ἀλλά',
+            'ἀπὸ',
+            'ἀπό',
+            'ἂν',
+            'ἄλλος',
+            'ἄν',
+            'ἄρα',
+            'ἐγὼ',
+            'ἐγώ',
+            'ἐκ',
+            'ἐξ',
+            'ἐμὸς',
+            'ἐμός',
+            'ἐν',
+            'ἐπὶ',
+            'ἐπί',
+            'ἐὰν',
+            'ἐάν',
+            'ἑαυτοῦ',
+            'ἔτι',
+            'ἡ',
+            'ἢ',
+            'ἤ',
+            'ὁ',
+            'ὃδε',
+            'ὃς',
+            'ὅδε',
+            'ὅς',
+            'ὅστις',
+            'ὅτι',
+            'ὑμὸς',
+            'ὑμός',
+            'ὑπὲρ',
+            'ὑπέρ',
+            'ὑπὸ',
+            'ὑπό',
+            'ὡς',
+            'ὥστε',
+            'ὦ',
+            'ξύν',
+            'ξὺν',
+            'σύν',
+            'σὺν',
+            'τοῖς',
+            'τᾶς',
+            'αὐτός',
+            'γάρ',
+            'δαί',
+            'δαίς',
+            'διά',
+            'δέ',
+            'δή',
+            'εἰμί',
+            'κατά',
+            'καί',
+            'μετά',
+            'μέν',
+            'μή',
+            'οὐδείς',
+            'οὐδέ',
+            'παρά',
+            'περί',
+            'πρός',
+            'σός',
+            'σύ',
+            'σύν',
+            'τοί',
+            'τούς',
+            'τά',
+            'τήν',
+            'τί',
+            'τίς',
+            'τό',
+            'τόν',
+            'ἀλλά',
+            'ἀπό',
+            'ἐγώ',
+            'ἐμός',
+            'ἐπί',
+            'ἐάν',
+            'ὑμός',
+            'ὑπέρ',
+            'ὑπό',
+            'λέγω',
+            'εἰμί#1',
+            'καί#1',
+            'οὕτω(ς)',
+            'γίγνομαι',
+            'ἔχω',
+            'εἰ#1',
+            'ὅτι#1', 
+            'νῦν#1', 
+            'νῦν', 
+            'εἰς'
+            'None']
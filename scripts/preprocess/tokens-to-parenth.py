@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Converts the token tables saved by xml-to-parenth-agdt.py and xml-to-parenth-proiel.py to parenthetical/parse trees
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+Applies the filtering rules (see DROP_POSTAGS and STOPWORDS below) to the token tables of an existing model and writes
+the trees of a new model, without reading the .xml files again. The trees are built by the same code as in the
+converters (tokentable.write_trees), so with the default settings they are the same.
+
+How to run:
+    $ python tokens-to-parenth.py
+
+Before running this script, you need to:
+    - have run xml-to-parenth-agdt.py and/or xml-to-parenth-proiel.py, which save outputs/modelname/tokens-*.npz
+
+Returns (for each token table, e.g. tokens-agdt.npz):
+    outputs/newmodelname/outparenth-agdt.txt (file): text file with one parenthetical tree per line
+    outputs/newmodelname/outstring-agdt.txt (file): text file with the same as the above, without parenthesis
+    outputs/newmodelname/outsource-agdt.txt (file): path to the source .xml file of each line in outparenth-agdt.txt
+    outputs/newmodelname/leftbehind-agdt.jsonl (file): one JSON object (sentence id, file, reason) per sentence which
+                                                      couldn't be processed
+    outputs/newmodelname/vocab.txt (file): the vocabulary of the original model, with any new lemmas appended
+"""
+
+from glob import glob
+import os
+
+from stopwords import STOPS_LIST
+import tokentable
+from vocab import Vocabulary
+from writers import TreeWriter
+
+DROP_POSTAGS = ('m', 'x', 'u') # Tokens whose postag (AGDT) or morphology (PROIEL) starts with one of these are emptied
+STOPWORDS = STOPS_LIST # Lemmas removed from the trees; set to [] to keep them all
+COMPRESS = False # gzip the output files (mergetrees.py reads both)
+
+modelname = input('Enter name of the model with the token tables (i.e. the folder with tokens-*.npz): ')
+newmodelname = input('Choose a name for the model with the new trees: ')
+
+if not os.path.exists('./outputs/{}'.format(newmodelname)):
+    os.mkdir('./outputs/{}'.format(newmodelname))
+
+# Start from the vocabulary of the original model, so the lemmas keep their ids
+vocab = Vocabulary('./outputs/{}/vocab.txt'.format(newmodelname), base='./outputs/{}/vocab.txt'.format(modelname))
+
+for path in glob('./outputs/{}/tokens-*.npz'.format(modelname)):
+    table = tokentable.load(path)
+    with TreeWriter('./outputs/{}'.format(newmodelname), table['scheme'], COMPRESS) as out:
+        tokentable.write_trees(table, out, vocab, DROP_POSTAGS, STOPWORDS, quiet=False)
+
+vocab.save()
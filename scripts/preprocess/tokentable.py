@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Columnar token table: the intermediate between the treebank .xml files and the parenthetical trees
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+xml-to-parenth-agdt.py and xml-to-parenth-proiel.py save every token they read in a token table
+(outputs/modelname/tokens-agdt.npz, tokens-proiel.npz), before any filtering, and write the trees of each file from
+its rows with write_trees() as they go. tokens-to-parenth.py runs write_trees() on a saved table with other filtering
+settings, so trying them does not require another pass over the .xml files, and with the same settings it writes the
+same trees as the converters.
+
+The .npz file holds one array per column, one row per token, in document order:
+    scheme: 'agdt' or 'proiel' (scalar)
+    sources: paths of the .xml files; source: index into sources of each token
+    sentence, token, head: sentence id, token id and head id ('head' in AGDT, 'head-id' in PROIEL)
+    lemma, postag: lemma and part-of-speech tag ('postag' in AGDT, 'morphology' in PROIEL)
+    artificial: 'artificial' in AGDT, 'empty-token-sort' in PROIEL
+    head_missing, lemma_missing, postag_missing, artificial_missing: True where the attribute is absent (the
+        string columns then hold ''), since an absent attribute is treated differently from an empty one
+"""
+
+import re
+
+import numpy as np
+from tqdm import tqdm
+
+from vocab import normalize
+from writers import UNATTACHED
+
+BRACKET = re.compile(r"\[[0-9]+\]") # lemmas like [0] mark artificial tokens
+COLUMNS = ('sentence', 'token', 'head', 'lemma', 'postag', 'artificial')
+OPTIONAL = ('head', 'lemma', 'postag', 'artificial')
+DROP_POSTAGS = ('m', 'x', 'u') # tags whose tokens are emptied unless told otherwise
+
+
+class TokenTable:
+    """Collects token rows while the converters parse the .xml files."""
+
+    def __init__(self):
+        self.sources = []
+        self.source = []
+        self.columns = {column: [] for column in COLUMNS}
+        self.missing = {column: [] for column in OPTIONAL}
+
+    def add(self, file, sentence, token, head, lemma, postag, artificial):
+        if len(self.sources) == 0 or self.sources[-1] != file:
+            self.sources.append(file)
+        self.source.append(len(self.sources) - 1)
+        row = {'sentence': sentence, 'token': token, 'head': head, 'lemma': lemma, 'postag': postag,
+               'artificial': artificial}
+        for column in COLUMNS:
+            self.columns[column].append('' if row[column] is None else str(row[column]))
+        for column in OPTIONAL:
+            self.missing[column].append(row[column] is None)
+
+    def __len__(self):
+        return len(self.source)
+
+    def arrays(self, scheme, start=0):
+        """The rows from start on as columns, like load() returns them."""
+        table = {column: np.array(values[start:], dtype=str) for column, values in self.columns.items()}
+        table.update({column + '_missing': np.array(values[start:], dtype=bool)
+                      for column, values in self.missing.items()})
+        table.update(scheme=scheme, sources=np.array(self.sources, dtype=str),
+                     source=np.array(self.source[start:], dtype=np.int32))
+        return table
+
+    def save(self, path, scheme):
+        np.savez_compressed(path, **dict(self.arrays(scheme), scheme=np.array(scheme)))
+
+
+def load(path):
+    with np.load(path) as npz:
+        table = {name: npz[name] for name in npz.files}
+    table['scheme'] = str(table['scheme'])
+    return table
+
+
+def labels(table, drop_postags=DROP_POSTAGS):
+    """
+    The node label of every token: no lemma, [n] lemmas, missing tags and tags starting with any of drop_postags give
+    an empty (AGDT: the 'artificial' value for the first three) label. Lemmas are normalized like the vocabulary.
+    """
+    lemma = table['lemma']
+    if table['scheme'] == 'agdt':
+        fallback = table['artificial'] # '' where absent
+    else:
+        fallback = np.full(len(lemma), '', dtype=lemma.dtype)
+
+    # Normalization and the bracket pattern are only applied once per distinct lemma
+    uniques, inverse = np.unique(lemma, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    bracket = np.array([BRACKET.match(u) is not None for u in uniques], dtype=bool)[inverse]
+    lemma = np.array([normalize(u) for u in uniques], dtype=str)[inverse]
+    dropped = np.zeros(len(lemma), dtype=bool)
+    for prefix in drop_postags:
+        dropped |= np.char.startswith(table['postag'], prefix)
+
+    # From the lowest to the highest priority rule, as in an if/elif chain
+    result = np.where(dropped, '', lemma)
+    result = np.where(table['postag_missing'], fallback, result)
+    result = np.where(bracket, fallback, result)
+    result = np.where(table['lemma_missing'], fallback, result)
+    result = np.where(~table['lemma_missing'] & (table['lemma'] == ''), '', result)
+    return result
+
+
+def sentences(table):
+    """(start, end) row ranges of the sentences in the table."""
+    n = len(table['token'])
+    if n == 0:
+        return []
+    change = (table['source'][1:] != table['source'][:-1]) | (table['sentence'][1:] != table['sentence'][:-1])
+    starts = np.concatenate([[0], np.flatnonzero(change) + 1])
+    ends = np.concatenate([starts[1:], [n]])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def serialize(table, names, start, end):
+    """
+    Parenthetical tree of the sentence in rows start:end (before cleaning): every head is followed by its dependents
+    in parentheses, leaves first and then the others, in document order. Tokens with an empty head hang from the root.
+    Returns None for sentences without edges (no root, or a single token) and False for sentences to leave behind
+    (some dependents cannot be reached from the root, e.g. because of a cycle).
+    """
+    ids = table['token'][start:end].tolist()
+    heads = table['head'][start:end].tolist()
+    head_missing = table['head_missing'][start:end].tolist()
+    if table['scheme'] == 'agdt':
+        roots = [str(head) == '0' and not missing for head, missing in zip(heads, head_missing)]
+        heads = [None if missing else head for head, missing in zip(heads, head_missing)]
+    else:
+        roots = head_missing
+
+    if not any(roots) or all(roots):
+        return None
+
+    governing = set(heads)
+    children = {'Root': [k for k in range(len(ids)) if roots[k]]}
+    for internal in (False, True):
+        for k in range(len(ids)):
+            if roots[k] or (ids[k] in governing) != internal:
+                continue
+            if heads[k] == '':
+                children['Root'].append(k)
+            else:
+                children.setdefault(str(heads[k]), []).append(k)
+
+    reached = set()
+
+    def expand(k):
+        deps = children.get(ids[k], [])
+        if len(deps) != 0:
+            reached.add(ids[k])
+        return names[start + k] + ' '.join('({})'.format(expand(d)) for d in deps)
+
+    if table['scheme'] == 'agdt':
+        tree = '(' + ' '.join(expand(k) for k in children['Root']) + ')'
+    else:
+        tree = '(' + ' '.join('({})'.format(expand(k)) for k in children['Root']) + ')'
+
+    if len(reached) != len(children) - 1:
+        return False
+    return tree
+
+
+def clean(trees, scheme, stops):
+    """
+    String clean-up of the trees (punctuation, digits, stop-words and empty parentheses), applied to all of them at
+    once: they are joined by newlines, which none of the patterns can match or remove.
+    """
+    text = '\n'.join(trees)
+    text = re.sub('punc1',' ', text)
+    text = re.sub('\\.',' ', text)
+    text = re.sub(',',' ', text)
+    text = re.sub(';',' ', text)
+    text = re.sub(' +',' ', text)
+    text = re.sub('\\(',' ( ', text)
+    text = re.sub('\\)',' ) ', text)
+    text = re.sub('elliptic',' ', text)
+    text = re.sub('\\[','', text)
+    text = re.sub('\\]','', text)
+    text = re.sub('[0-9]',' ', text)
+    if scheme == 'proiel':
+        text = re.sub('#',' ', text)
+    for word in stops:
+        text = re.sub(' {} '.format(word),' ',text)
+        text = re.sub(' +',' ', text)
+        text = re.sub('\\( \\)','',text)
+        text = re.sub('\\(\\)','',text)
+        text = re.sub(' +',' ', text)
+    return [line.strip() for line in text.split('\n')]
+
+
+def write_trees(table, out, vocab, drop_postags=DROP_POSTAGS, stops=(), quiet=True):
+    """
+    Write the tree of every sentence in the table with out (a writers.TreeWriter) and intern its lemmas in vocab.
+    Trees are cleaned and written in batches of out.flush_every sentences.
+    """
+    names = labels(table, drop_postags).tolist()
+    trees = []
+    kept = [] # source of every tree
+
+    def write():
+        for tree, file in zip(clean(trees, table['scheme'], stops), kept):
+            for lemma in out.write(tree, file):
+                vocab.intern(lemma)
+        trees.clear()
+        kept.clear()
+
+    for start, end in tqdm(sentences(table), desc=table['scheme'], disable=quiet):
+        tree = serialize(table, names, start, end)
+        file = str(table['sources'][table['source'][start]])
+        if tree is False:
+            out.leftbehind(str(table['sentence'][start]), file, UNATTACHED)
+        elif tree is not None:
+            trees.append(tree)
+            kept.append(file)
+            if len(trees) == out.flush_every:
+                write()
+    write()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Persistent lemma vocabulary shared by the whole pipeline
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+Every lemma written to the trees is normalized (Unicode NFC, so that e.g. oxia and tonos accents are the same
+character) and given a stable integer id: its line number in outputs/modelname/vocab.txt. The file is append-only:
+lemmas are never removed or reordered, so ids stay the same across incremental runs. train.py builds the supergraph
+and trains on these ids and only translates them back to lemmas when it saves the vectors.
+
+Do not run two converters on the same model at the same time, as both append to the same vocab.txt.
+"""
+
+import os
+import unicodedata
+
+
+def normalize(lemma):
+    return unicodedata.normalize('NFC', lemma)
+
+
+class Vocabulary:
+
+    def __init__(self, path, base=None):
+        """Load path if it exists, otherwise start from the vocabulary in base (if given) and save to path."""
+        self.path = path
+        self.labels = []
+        self.ids = {}
+        source = path if os.path.exists(path) else base
+        if source is not None and os.path.exists(source):
+            with open(source, 'r') as intxt:
+                self.labels = [line.rstrip('\n') for line in intxt.readlines()]
+            self.ids = {label: i for i, label in enumerate(self.labels)}
+
+    def intern(self, lemma):
+        lemma = normalize(lemma)
+        i = self.ids.get(lemma)
+        if i is None:
+            i = self.ids[lemma] = len(self.labels)
+            self.labels.append(lemma)
+        return i
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as outtxt:
+            for label in self.labels:
+                outtxt.write(label + '\n')
+        os.replace(tmp, self.path)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Buffered, streaming output files shared by the converters and tokens-to-parenth.py
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+TreeWriter writes the outputs of one annotation scheme as it goes, instead of keeping them in memory until the end:
+    outparenth-<scheme>.txt: one parenthetical tree per line
+    outstring-<scheme>.txt: the same without the parentheses, one line per sentence
+    outsource-<scheme>.txt: the source file of every line of outparenth-<scheme>.txt
+    leftbehind-<scheme>.jsonl: one {"sentence": ..., "file": ..., "reason": ...} object per sentence left out
+Lines are collected in lists and written to all four files together every FLUSH_EVERY sentences (or once BUFFER_CHARS
+characters are waiting), then synced to disk. The files are also flushed when the run stops for any reason, Ctrl-C
+included, so an interrupted run leaves complete, aligned lines for every sentence processed. With compress=True the
+files are gzip-compressed ('.gz' is added to their names), every flush as a gzip member of its own: a run that is
+killed outright (SIGKILL, out of memory) leaves at most its last member cut short, and open_text reads such a file up
+to the last complete member, so mergetrees.py reads either kind of file after any stop.
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+import zlib
+
+FLUSH_EVERY = 1000 # sentences between writes to disk
+BUFFER_CHARS = 16 * 1024 ** 2 # write earlier if this many characters are waiting
+
+UNATTACHED = 'some tokens could not be attached to the tree (cycle or missing head)'
+
+_PARENTHESES = str.maketrans('()', '  ')
+_SPACES = re.compile(' +')
+
+
+def _complete_members(path):
+    """Text of the complete gzip members of path; a last member cut short by a killed run is left out."""
+    with open(path, 'rb') as raw:
+        data = raw.read()
+    members = []
+    while len(data) != 0:
+        member = zlib.decompressobj(16 + zlib.MAX_WBITS) # with the gzip header and trailer
+        try:
+            text = member.decompress(data)
+        except zlib.error:
+            break
+        if not member.eof:
+            break
+        members.append(text)
+        data = member.unused_data
+    return b''.join(members).decode('utf-8')
+
+
+def open_text(path, mode='r'):
+    """
+    open() for the text files of the pipeline, gzip-compressed if the name ends in .gz. Compressed files are read up
+    to their last complete gzip member, without the EOFError gzip raises on a file that was not closed.
+    """
+    if path.endswith('.gz'):
+        if mode == 'r':
+            return io.StringIO(_complete_members(path), newline=None)
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+class TreeWriter:
+
+    def __init__(self, folder, scheme, compress=False, flush_every=FLUSH_EVERY):
+        self.compress = compress
+        names = {'trees': 'outparenth-{}.txt', 'strings': 'outstring-{}.txt', 'sources': 'outsource-{}.txt',
+                 'leftbehind': 'leftbehind-{}.jsonl'}
+        if compress: # written as raw bytes, one gzip member per flush (see flush)
+            self.files = {key: open(os.path.join(folder, name.format(scheme) + '.gz'), 'wb')
+                          for key, name in names.items()}
+        else:
+            self.files = {key: open_text(os.path.join(folder, name.format(scheme)), 'w')
+                          for key, name in names.items()}
+        self.buffers = {key: [] for key in self.files}
+        self.flush_every = flush_every
+        self.pending = 0 # sentences since the last flush
+        self.chars = 0
+
+    def write(self, tree, file):
+        """Add the cleaned tree of one sentence (may be empty) and the file it comes from; return its lemmas."""
+        if '\n' in tree: # lemmas should never contain line breaks, but if one does, keep one tree per line
+            lines = [line for line in tree.split('\n') if line.strip() != '']
+            tree = '\n'.join(lines)
+            count = len(lines)
+        else:
+            count = 1 if tree != '' else 0
+        if count != 0:
+            self.buffers['trees'].append(tree + '\n')
+            self.buffers['sources'].append((file + '\n') * count) # one line per tree line, so the two files stay aligned
+        stringonly = _SPACES.sub(' ', tree.translate(_PARENTHESES))
+        self.buffers['strings'].append(stringonly + '\n')
+        self._done(2 * len(tree) + count * len(file))
+        return stringonly.split()
+
+    def leftbehind(self, sentence, file, reason):
+        self.buffers['leftbehind'].append(json.dumps({'sentence': sentence, 'file': file, 'reason': reason},
+                                                     ensure_ascii=False) + '\n')
+        self._done(len(file))
+
+    def _done(self, chars):
+        self.pending += 1
+        self.chars += chars
+        if self.pending >= self.flush_every or self.chars >= BUFFER_CHARS:
+            self.flush()
+
+    def flush(self):
+        for key, out in self.files.items():
+            if not self.compress:
+                out.writelines(self.buffers[key])
+            elif len(self.buffers[key]) != 0:
+                # A complete member per flush: once synced, it reads back whatever happens to the run afterwards
+                out.write(gzip.compress(''.join(self.buffers[key]).encode('utf-8')))
+            self.buffers[key].clear()
+        for out in self.files.values():
+            out.flush()
+            os.fsync(out.fileno())
+        self.pending = 0
+        self.chars = 0
+
+    def close(self):
+        self.flush()
+        for out in self.files.values():
+            out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
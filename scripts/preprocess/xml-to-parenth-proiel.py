@@ -11,6 +11,8 @@ Author: Nilo Pedrazzini (unless otherwise stated)
 Converts Ancient Greek treebanks in the PROIEL format to parenthetical/parse tree, without the dependency tag (needed as input to node2vec). 
 NB: we use lemmas, not token forms, and we remove stopwords. Multiple empty parentheses are kept because they indicate 
 an empty node and create a distance in the graph between words which would otherwise end up close to each other when in reality they aren't
+The tokens of every file are read into a token table and the trees are built from it by tokentable.write_trees, the
+same code tokens-to-parenth.py uses.
 
 How to run:
     $ python xml-to-parenth-proiel.py
@@ -24,372 +26,52 @@ Returns:
     outputs/modelname/ (dir): Dedicated folder under outputs/ where all outputs 
                                   from a specific test run will be saved.
     outputs/modelname/outparenth-proiel.txt (file): text file with one parenthetical tree per line (e.g. ( εἰσαπόλλυμι ( μικρός ) ( νή ( Ζεύς ) ) )))
-    outputs/modelname/outstring-proiel.txt (file): text file with the same as the above, without parenthesis
-    outputs/modelname/leftout-proiel.txt (file): text file with paths to all files which couldn't be processed because of some error
+    outputs/modelname/outstring-proiel.txt (file): text file with the same as the above, without parenthesis (one line per sentence)
+    outputs/modelname/outsource-proiel.txt (file): path to the source .xml file of each line in outparenth-proiel.txt
+    outputs/modelname/leftbehind-proiel.jsonl (file): one JSON object (sentence id, file, reason) per sentence which couldn't be processed
+    outputs/modelname/tokens-proiel.npz (file): columnar table of all tokens read, before filtering (see tokentable.py)
+    outputs/modelname/vocab.txt (file): one lemma per line, the line number being its id (appended to, see vocab.py)
+    With COMPRESS = True, the outparenth, outstring, outsource and leftbehind files are gzipped ('.gz' added to the names).
 """
 
 from bs4 import BeautifulSoup
-import re
-from re import search
 from glob import glob
 from tqdm import tqdm
 import os
 
-# The list of stop-words, compiled by Alessandro Vatri based on the Perseus Hopper source, is available at https://figshare.com/articles/Ancient_Greek_stop_words/9724613.
-# This list comes from the Perseus Hopper source [http://sourceforge.net/projects/perseus-hopper],
-# found at "/sgml/reading/build/stoplists", though this only contained acute accents on the ultima.
-# There has been added to this grave accents to the ultima of each.
-# Perseus source is made available under the Mozilla Public License 1.1 (MPL 1.1) [http://www.mozilla.org/MPL/1.1/].
-# 	__author__ = ['Kyle P. Johnson <kyle@kyle-p-johnson.com>']
-# 	__license__ = 'GPL License.'
-# Vatri: added support for tonos vs oxia acute accent
-# Martina Astrid Rodda: added 'None'
-# Nilo Pedrazzini added λέγω,'εἰμί#1','καί#1','οὕτω(ς)','γίγνομαι','ἔχω','εἰ#1',ὅτι#1, νῦν#1, νῦν, εἰς
+from stopwords import STOPS_LIST
+from tokentable import TokenTable, write_trees
+from vocab import Vocabulary
+from writers import TreeWriter
 
 modelname = input('Choose a name for your model: ')
 if not os.path.exists('./outputs/{}'.format(modelname)):
     os.mkdir('./outputs/{}'.format(modelname))
 
-STOPS_LIST = ['αὐτὸς',
-            'αὐτός',
-            'γε',
-            'γὰρ',
-            'γάρ',
-            "δ'",
-            'δαὶ',
-            'δαὶς',
-            'δαί',
-            'δαίς',
-            'διὰ',
-            'διά',
-            'δὲ',
-            'δέ',
-            'δὴ',
-            'δή',
-            'εἰ',
-            'εἰμὶ',
-            'εἰμί',
-            'εἰς',
-            'εἴμι',
-            'κατὰ',
-            'κατά',
-            'καὶ',
-            'καί',
-            'μετὰ',
-            'μετά',
-            'μὲν',
-            'μέν',
-            'μὴ',
-            'μή',
-            'οἱ',
-            'οὐ',
-            'οὐδεὶς',
-            'οὐδείς',
-            'οὐδὲ',
-            'οὐδέ',
-            'οὐκ',
-            'οὔτε',
-            'οὕτως',
-            'οὖν',
-            'οὗτος',
-            'παρὰ',
-            'παρά',
-            'περὶ',
-            'περί',
-            'πρὸς',
-            'πρός',
-            'σὸς',
-            'σός',
-            'σὺ',
-            'σὺν',
-            'σύ',
-            'σύν',
-            'τε',
-            'τι',
-            'τις',
-            'τοιοῦτος',
-            'τοὶ',
-            'τοί',
-            'τοὺς',
-            'τούς',
-            'τοῦ',
-            'τὰ',
-            'τά',
-            'τὴν',
-            'τήν',
-            'τὶ',
-            'τὶς',
-            'τί',
-            'τίς',
-            'τὸ',
-            'τὸν',
-            'τό',
-            'τόν',
-            'τῆς',
-            'τῇ',
-            'τῶν',
-            'τῷ',
-            "ἀλλ'",
-            'ἀλλὰ',
-            'ἀλλά',
-            'ἀπὸ',
-            'ἀπό',
-            'ἂν',
-            'ἄλλος',
-            'ἄν',
-            'ἄρα',
-            'ἐγὼ',
-            'ἐγώ',
-            'ἐκ',
-            'ἐξ',
-            'ἐμὸς',
-            'ἐμός',
-            'ἐν',
-            'ἐπὶ',
-            'ἐπί',
-            'ἐὰν',
-            'ἐάν',
-            'ἑαυτοῦ',
-            'ἔτι',
-            'ἡ',
-            'ἢ',
-            'ἤ',
-            'ὁ',
-            'ὃδε',
-            'ὃς',
-            'ὅδε',
-            'ὅς',
-            'ὅστις',
-            'ὅτι',
-            'ὑμὸς',
-            'ὑμός',
-            'ὑπὲρ',
-            'ὑπέρ',
-            'ὑπὸ',
-            'ὑπό',
-            'ὡς',
-            'ὥστε',
-            'ὦ',
-            'ξύν',
-            'ξὺν',
-            'σύν',
-            'σὺν',
-            'τοῖς',
-            'τᾶς',
-            'αὐτός',
-            'γάρ',
-            'δαί',
-            'δαίς',
-            'διά',
-            'δέ',
-            'δή',
-            'εἰμί',
-            'κατά',
-            'καί',
-            'μετά',
-            'μέν',
-            'μή',
-            'οὐδείς',
-            'οὐδέ',
-            'παρά',
-            'περί',
-            'πρός',
-            'σός',
-            'σύ',
-            'σύν',
-            'τοί',
-            'τούς',
-            'τά',
-            'τήν',
-            'τί',
-            'τίς',
-            'τό',
-            'τόν',
-            'ἀλλά',
-            'ἀπό',
-            'ἐγώ',
-            'ἐμός',
-            'ἐπί',
-            'ἐάν',
-            'ὑμός',
-            'ὑπέρ',
-            'ὑπό',
-            'λέγω',
-            'εἰμί#1',
-            'καί#1',
-            'οὕτω(ς)',
-            'γίγνομαι',
-            'ἔχω',
-            'εἰ#1',
-            'ὅτι#1', 
-            'νῦν#1', 
-            'νῦν', 
-            'εἰς'
-            'None']
+
 
 # If your treebanks are organized in subfolders, then you can use the following syntax instead (uncomment and comment relevant lines):
 # proiel = glob('./TREEBANKS/proiel-treebank/*xml')
 proiel = glob('./PROIEL_treebanks/*xml')
 
-leftbehind = '' # we start a string containing the paths to all files which returned errors
+COMPRESS = False # gzip the output files (mergetrees.py reads both)
+
+table = TokenTable() # see tokentable.py
+vocab = Vocabulary('./outputs/{}/vocab.txt'.format(modelname)) # see vocab.py; shared by both converters
 
-with open('./outputs/{}/outparenth-proiel.txt'.format(modelname), 'w') as outtxt: # This will be where the parenthetical parse trees will be written
-    with open('./outputs/{}/outstring-proiel.txt'.format(modelname),'w') as outtxt2: # This will be where the above without the parentheses will be written
-        for file in tqdm(proiel):
-            with open(file, 'r') as tei:
-                # print('Now checking {}...'.format(file))
-                soup = BeautifulSoup(tei, "lxml")
-                sentences = soup.find_all('sentence')
-                for sentence in sentences:
-                    words = sentence.find_all('token')
-                    # print(file)
-                    # print(sentence.get('id'))
-                    tokens = []
-                    parenth = ''
-                    depsall = 0
-                    rootids = []
-                    for word in words:
-                        if str(word.get('head-id')) != 'None':
-                            # Only to check if there are any dependants at all (some trees are one-token only)
-                            depsall += 1
-                        if str(word.get('head-id')) == 'None': # Find out what the head is
-                            # if word.get('relation') != 'parpred' and word.get('relation') != 'voc':
-                            # rootid = word.get('id')
-                            rootids.append(str('id' + str(word.get('id')) + 'id'))
-                    # print('ROOTIDS',rootids)
-                    if len(rootids) != 0:
-                        bottoms = []
-                        for word in words:
-                            deps = sentence.find_all('token',attrs={"head-id": word.get('id')})
-                            if len(deps) == 0:
-                                if str(str('id' + str(word.get('id')) + 'id')) not in rootids: # to avoid taking a child like token id 1238559 as both root and bottom
-                                    bottoms.append(str('id' + str(word.get('id')) + 'id'))
-                        # print('bottoms',bottoms)
-                        allrest = []
-                        for word in words:
-                            if str('id' + str(word.get('id')) + 'id') not in rootids and str('id' + str(word.get('id')) + 'id') not in bottoms:
-                                allrest.append(str('id' + str(word.get('id')) + 'id'))
-                        # print('allrest',allrest)
-                        rootheads = []
-                        for id in rootids:
-                            idword = sentence.find('token',attrs={"id": id.split('id')[1]})
-                            head = 'Root'
-                            rootheads.append((head,id))
-                        # print('ROOTHEADS',rootheads) 
-                        bottomsheads = []
-                        for id in bottoms:
-                            # print(id)
-                            idword = sentence.find('token',attrs={"id": id.split('id')[1]})
-                            if idword.get('head-id') != '':
-                                head = str('id' + str(idword.get('head-id')) + 'id')
-                                bottomsheads.append((head,id))
-                            else:
-                                head = 'Root'
-                                rootheads.append((head,id))
-                            # print(bottomsheads)
-                        # print('bottomsheads',bottomsheads)
-                        allrestheads = []
-                        for id in allrest:
-                            idword = sentence.find('token',attrs={"id": id.split('id')[1]})
-                            if idword.get('head-id') != '':
-                                head = str('id' + str(idword.get('head-id')) + 'id')
-                                allrestheads.append((head,id))
-                            else:
-                                head = 'Root'
-                                rootheads.append((head,id))
-                        # print('allrestheads',allrestheads)
-                        final = rootheads + bottomsheads + allrestheads
-                        result = {}
-                        # print('final', final)
-                        for i in final:
-                            result.setdefault(i[0],[]).append(i[1])
-                        # print(result)
-                        # print('RESULT', result)
-                        finalstring = ''
-                        if depsall != 0:
-                            # print('Now creating the final string')
-                            finalstring += str('Root')
-                            finalstring += ' ('
-                            finalstring += ' '.join('({})'.format(x) for x in result['Root'])
-                            finalstring += ')'
-                            result.pop('Root')
-                            infin = 0
-                            while len(result) != 0:
-                                if infin != len(result):
-                                    infin = len(result)
-                                    # print(result)
-                                    # print(sentence)
-                                    ids = []
-                                    for i in result:
-                                        if search(i, finalstring):
-                                            ids.append(i)
-                                            finalstring = re.sub(str(i),str(str(i) + ' '.join('({})'.format(x) for x in result[i])), finalstring)
-                                    for id in ids:
-                                        result.pop(id)
-                                else:
-                                    break
-                        if infin != len(result):
-                            finalstring = re.sub('Root \(', '(', finalstring)
-                            # print(finalstring)
-                            words = sentence.find_all('token')
-                            for word in words:
-                                # print(word.get('lemma'))
-                                try:
-                                    # print(word.get('lemma'))
-                                    pattern = re.compile("\[[0-9]+\]")
-                                    if word.get('lemma') == '':
-                                        finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                                    elif pattern.match(word.get('lemma')):
-                                        finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                                    elif word.get('morphology').startswith('m'):
-                                        finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                                    elif word.get('morphology').startswith('x'):
-                                        finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                                    elif word.get('morphology').startswith('u'):
-                                        finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                                    else:
-                                        finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),word.get('lemma'),finalstring)
-                                except AttributeError:
-                                    finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                                except TypeError:
-                                    finalstring = re.sub(str('id' + str(word.get('id')) + 'id'),'',finalstring)
-                            finalstring = re.sub('punc1',' ', finalstring)
-                            finalstring = re.sub('\.',' ', finalstring)
-                            finalstring = re.sub(',',' ', finalstring)
-                            finalstring = re.sub(';',' ', finalstring)
-                            finalstring = re.sub(' +',' ', finalstring)
-                            # finalstring = re.sub('\) \)','))', finalstring) 
-                            finalstring = re.sub('\(',' ( ', finalstring) 
-                            finalstring = re.sub('\)',' ) ', finalstring) 
-                            finalstring = re.sub('elliptic',' ', finalstring) 
-                            finalstring = re.sub('\[','', finalstring)
-                            finalstring = re.sub('\]','', finalstring)
-                            finalstring = re.sub('[0-9]',' ', finalstring)
-                            finalstring = re.sub('#',' ', finalstring)
-                            for word in STOPS_LIST:
-                                finalstring = re.sub(' {} '.format(word),' ',finalstring)
-                                finalstring = re.sub(' +',' ', finalstring)
-                                finalstring = re.sub('\( \)','',finalstring)
-                                finalstring = re.sub('\(\)','',finalstring)
-                                finalstring = re.sub(' +',' ', finalstring)
-                            finalstring = finalstring.strip()
-                            finalstring = finalstring.split("\n")
-                            finalstring = [line for line in finalstring if line.strip() != ""]
-                            finalstring2 = ""
-                            for line in finalstring:
-                                finalstring2 += line + "\n"
-                            # print('FINALSTRING', finalstring2)
-                            outtxt.write(finalstring2)
-                            stringonly = ' '.join(finalstring2.split('('))
-                            stringonly = ' '.join(stringonly.split(')'))
-                            stringonly = re.sub(' +',' ',stringonly)
-                            outtxt2.write(stringonly)
-                            outtxt2.write('\n')
-                        else:
-                            leftbehind += str(sentence.get('id'))
-                            leftbehind += str(' ' + file + '\n')
-                    else:
-                        continue
+with TreeWriter('./outputs/{}'.format(modelname), 'proiel', COMPRESS) as out: # trees, strings, sources and leftbehind log (see writers.py)
+    for file in tqdm(proiel):
+        first = len(table) # rows of this file start here
+        with open(file, 'r') as tei:
+            # print('Now checking {}...'.format(file))
+            soup = BeautifulSoup(tei, "lxml")
+            sentences = soup.find_all('sentence')
+            for sentence in sentences:
+                words = sentence.find_all('token')
+                for word in words: # every token goes into the token table, before any filtering
+                    table.add(file, sentence.get('id'), word.get('id'), word.get('head-id'), word.get('lemma'), word.get('morphology'), word.get('empty-token-sort'))
+            # The trees of this file are built from its rows of the table, by the same code as in tokens-to-parenth.py
+            write_trees(table.arrays('proiel', first), out, vocab, stops=STOPS_LIST)
 
-with open('./outputs/{}/leftbehind-proiel.txt'.format(modelname), 'w') as outtxt:
-    outtxt.write(leftbehind)
\ No newline at end of file
+table.save('./outputs/{}/tokens-proiel.npz'.format(modelname), 'proiel')
+vocab.save()
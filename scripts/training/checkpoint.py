@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Checkpointing helpers used by train.py to resume interrupted walk generation and Word2Vec training
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+Walks are generated in shards (see walks.py). Each shard is seeded from the run seed and its own index, so it comes out
+the same whether it is generated in the first run or after a restart, and whatever the number of workers. Word2Vec is
+trained one epoch (one train() call) at a time: after every epoch the full model (including its internal RNG) is
+saved, and a restarted job continues with the learning rate it would have had in an uninterrupted run. With workers=1
+a resumed run yields the same final model as an uninterrupted one with the same seed.
+
+Saves:
+    outputs/modelname/checkpoints/meta.json (file): parameters and supergraph fingerprint the checkpoints belong to
+    outputs/modelname/checkpoints/walks/shard-XXXX.npy (file): one finished walk shard (int32 array, one walk per row)
+    outputs/modelname/checkpoints/w2v-epochN.model (file): Word2Vec state after N epochs
+    outputs/modelname/checkpoints/rng-epochN.pkl (file): state of the python and numpy global RNGs after N epochs
+    outputs/modelname/checkpoints/w2v-state.json (file): epochs done, the files of that epoch, the original learning
+                                                         rate schedule, epoch times and the convergence history (see
+                                                         convergence.py)
+An epoch is only committed when w2v-state.json (written last, atomically) names its files; the files of the previous
+epoch are deleted after that, so a job killed at any point resumes from a consistent model, RNG and state.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import pickle
+import random
+import re
+import time
+
+import numpy as np
+from gensim.models import Word2Vec
+from tqdm import tqdm
+
+from walks import generate_walks
+
+_EPOCH_FILE = re.compile(r'^(w2v-epoch\d+\.model|rng-epoch\d+\.pkl)(\..*)?$') # gensim may add .npy files to a model
+
+
+def _atomic_dump(obj, path):
+    # Write to a temporary file first so a job killed mid-write never leaves a truncated checkpoint behind
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as out:
+        pickle.dump(obj, out, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def _atomic_json(obj, path):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as out:
+        json.dump(obj, out, indent=2)
+    os.replace(tmp, path)
+
+
+def save_rng(path):
+    _atomic_dump({'python': random.getstate(), 'numpy': np.random.get_state()}, path)
+
+
+def restore_rng(path):
+    with open(path, 'rb') as intxt:
+        state = pickle.load(intxt)
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+
+
+def check_meta(checkpoint_dir, meta):
+    """Create the checkpoint folder, or make sure the checkpoints already in it belong to the same run settings."""
+    os.makedirs(os.path.join(checkpoint_dir, 'walks'), exist_ok=True)
+    path = os.path.join(checkpoint_dir, 'meta.json')
+    if os.path.exists(path):
+        with open(path, 'r') as intxt:
+            previous = json.load(intxt)
+        if previous != meta:
+            raise ValueError('Checkpoints in {} were made with different settings or a different supergraph '
+                             '({} vs {}). Delete the folder to start from scratch.'.format(checkpoint_dir, previous, meta))
+    else:
+        _atomic_json(meta, path)
+
+
+def _walk_shard(path, tables, num_walks, walk_length, seed, memory):
+    # The tables are opened (memory-mapped) inside the worker, so all workers share the same read-only pages
+    walks = generate_walks(tables, num_walks, walk_length, seed, memory)
+    tmp = path + '.tmp.npy'
+    np.save(tmp, walks)
+    os.replace(tmp, path)
+
+
+def walk_shards(tables, checkpoint_dir, num_walks, walk_length, num_shards=10, seed=0, workers=1, quiet=False,
+                memory=None):
+    """
+    Generate the walks over the transition tables in the given folder (see walks.transition_tables) in shards,
+    skipping the shards already on disk. Returns the paths of all the shards, in order.
+    memory: bytes of adjacency and tables each worker may hold at a time (see walks.generate_walks).
+    """
+    num_walks_lists = np.array_split(range(num_walks), num_shards)
+    shards = [(shard, os.path.join(checkpoint_dir, 'walks', 'shard-{:04d}.npy'.format(shard)), len(walks))
+              for shard, walks in enumerate(num_walks_lists) if len(walks) != 0]
+
+    pending = [(shard, path, n) for shard, path, n in shards if not os.path.exists(path)]
+    if len(pending) < len(shards):
+        print('Resuming: {} of {} walk shards already on disk'.format(len(shards) - len(pending), len(shards)))
+
+    jobs = [(path, tables, n, walk_length, seed * 100003 + shard, memory) for shard, path, n in pending]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in tqdm(pool.map(_walk_shard, *zip(*jobs)), total=len(jobs), desc='Walk shards', disable=quiet):
+                pass
+    else:
+        for job in tqdm(jobs, desc='Walk shards', disable=quiet):
+            _walk_shard(*job)
+    return [path for _, path, _ in shards]
+
+
+def _save_epoch(model, checkpoint_dir, state):
+    """Save the model and the RNGs under names of this epoch, then commit them by writing the state."""
+    model.callbacks = () # callbacks only belong to the train() call that used them (and may not be picklable)
+    state['model'] = 'w2v-epoch{}.model'.format(state['epochs_done'])
+    state['rng'] = 'rng-epoch{}.pkl'.format(state['epochs_done'])
+    model.save(os.path.join(checkpoint_dir, state['model']))
+    save_rng(os.path.join(checkpoint_dir, state['rng']))
+    _atomic_json(state, os.path.join(checkpoint_dir, 'w2v-state.json'))
+    _prune(checkpoint_dir, state)
+
+
+def _prune(checkpoint_dir, state):
+    """Delete the model and RNG files of every epoch but the committed one (earlier epochs, or one never committed)."""
+    for name in os.listdir(checkpoint_dir):
+        match = _EPOCH_FILE.match(name)
+        if match is not None and match.group(1) not in (state['model'], state['rng']):
+            os.remove(os.path.join(checkpoint_dir, name))
+
+
+def fit_with_checkpoints(walks, checkpoint_dir, monitor=None, **skip_gram_params):
+    """
+    Word2Vec(walks, **skip_gram_params), but continues from the last saved epoch if there is one.
+    walks must be re-iterable (e.g. a walks.WalkCorpus), as it is read once per epoch.
+    With a convergence.ConvergenceMonitor, the loss is tracked and training may stop before the last epoch.
+    Returns the model and the training state (epochs done, epoch times, monitor history, reason for stopping).
+    """
+    state_path = os.path.join(checkpoint_dir, 'w2v-state.json')
+
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as intxt:
+            state = json.load(intxt)
+        model = Word2Vec.load(os.path.join(checkpoint_dir, state['model']))
+        restore_rng(os.path.join(checkpoint_dir, state['rng']))
+        _prune(checkpoint_dir, state) # files of an epoch the killed job had saved but not committed
+        print('Resuming Word2Vec after epoch {} of {}'.format(state['epochs_done'], state['epochs']))
+    else:
+        model = Word2Vec(**skip_gram_params) # no corpus given, so this only sets the model up
+        model.build_vocab(walks)
+        state = {'epochs_done': 0, 'epochs': model.epochs, 'alpha': model.alpha, 'min_alpha': model.min_alpha,
+                 'epoch_seconds': [], 'stopped': None, 'monitor': None}
+        _save_epoch(model, checkpoint_dir, state)
+
+    if monitor is not None:
+        monitor.restore(state['monitor'])
+
+    def alpha_at(epoch):
+        return state['alpha'] - (state['alpha'] - state['min_alpha']) * epoch / state['epochs']
+
+    while state['epochs_done'] < state['epochs'] and state['stopped'] is None:
+        # One train() call per epoch. gensim decays alpha linearly within a call, so going from this epoch's
+        # learning rate to the next one's gives every batch the rate of a single call over all epochs.
+        epoch = state['epochs_done']
+        started = time.time()
+        model.train(
+            monitor.corpus(walks, model, epoch) if monitor is not None else walks,
+            total_examples=model.corpus_count,
+            epochs=1,
+            start_alpha=alpha_at(epoch),
+            end_alpha=alpha_at(epoch + 1),
+            compute_loss=monitor is not None
+        )
+        state['epoch_seconds'].append(time.time() - started)
+        state['epochs_done'] += 1
+        if monitor is not None:
+            stopped = monitor.epoch_end(model)
+            if state['epochs_done'] < state['epochs']: # converging on the last epoch is not stopping early
+                state['stopped'] = stopped
+            state['monitor'] = monitor.state()
+            if state['stopped'] is not None:
+                print('Stopping after epoch {} of {}: {}'.format(state['epochs_done'], state['epochs'], state['stopped']))
+        _save_epoch(model, checkpoint_dir, state)
+
+    # train() overwrites these with the values of the last call
+    model.alpha, model.min_alpha, model.epochs = state['alpha'], state['min_alpha'], state['epochs']
+    return model, state
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Convergence monitoring and early stopping for the Word2Vec stage of train.py
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+After every epoch we record the training loss of the epoch and, for a few sentinel lemmas (e.g. the ones queried in
+most_similar.py), how many of their nearest neighbours are the same as after the previous epoch. The running loss is
+also recorded every loss_chunk words within an epoch, as Word2Vec reads the walks (gensim 4 never calls the batch
+callbacks, so the corpus itself is watched). Training stops early once every enabled criterion is met:
+    - loss_tolerance: the epoch lowered the loss, by less than this fraction of the previous epoch's loss (an epoch
+      whose loss went up is not converged: it is noise or a learning rate still too high, so training goes on)
+    - stability: the sentinels kept at least this share of their neighbours
+"""
+
+class ChunkLoss:
+    """
+    The walks of one epoch, recording the running loss of model every `every` words read by train(). The loss lags
+    behind the words read by the jobs still waiting for a worker (a few batches).
+    """
+
+    def __init__(self, corpus, model, epoch, every, records):
+        self.corpus = corpus
+        self.model = model
+        self.epoch = epoch
+        self.every = every
+        self.records = records
+
+    def __iter__(self):
+        words = 0
+        due = self.every
+        for walk in self.corpus:
+            yield walk
+            words += len(walk)
+            if words >= due:
+                self.records.append([self.epoch, words, float(self.model.get_latest_training_loss())])
+                due += self.every * ((words - due) // self.every + 1)
+
+
+class ConvergenceMonitor:
+
+    def __init__(self, sentinels=(), topn=10, loss_tolerance=None, stability=None, loss_chunk=1000000):
+        """sentinels: Word2Vec keys (node ids as strings) whose neighbours are probed after every epoch."""
+        self.sentinels = list(sentinels)
+        self.topn = topn
+        self.loss_tolerance = loss_tolerance
+        self.stability = stability
+        self.loss_chunk = loss_chunk
+        self.history = {'losses': [], 'chunk_losses': [], 'stability': [], 'neighbours': {}}
+
+    def state(self):
+        return self.history
+
+    def restore(self, history):
+        if history is not None:
+            self.history = history
+
+    def corpus(self, walks, model, epoch):
+        """The walks to train epoch on, recording the running loss as they are read."""
+        return ChunkLoss(walks, model, epoch, self.loss_chunk, self.history['chunk_losses'])
+
+    def epoch_end(self, model):
+        """Record the epoch just trained; return the reason to stop, or None to go on."""
+        losses = self.history['losses']
+        losses.append(float(model.get_latest_training_loss())) # reset by gensim at the start of every train() call
+
+        neighbours = {}
+        for key in self.sentinels:
+            if key in model.wv.key_to_index:
+                neighbours[key] = [k for k, _ in model.wv.most_similar(key, topn=self.topn)]
+        previous = self.history['neighbours']
+        shared = [len(set(neighbours[key]) & set(previous[key])) / self.topn for key in neighbours if key in previous]
+        stability = sum(shared) / len(shared) if len(shared) != 0 else None
+        self.history['stability'].append(stability)
+        self.history['neighbours'] = neighbours
+
+        if len(losses) < 2 or (self.loss_tolerance is None and self.stability is None):
+            return None
+        reasons = []
+        if self.loss_tolerance is not None:
+            improvement = (losses[-2] - losses[-1]) / losses[-2] if losses[-2] > 0 else 0
+            if not 0 <= improvement < self.loss_tolerance:
+                return None
+            reasons.append('loss improved by {:.2%}'.format(improvement))
+        if self.stability is not None:
+            if stability is None or stability < self.stability:
+                return None
+            reasons.append('sentinel neighbour overlap {:.2f}'.format(stability))
+        return ', '.join(reasons)
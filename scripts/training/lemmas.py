@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Lemma normalization and tree edges shared by train.py and subcorpora.py
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+normalize() is the rule of the vocabulary written by the converters (preprocess/vocab.py: Unicode NFC, so that e.g.
+oxia and tonos accents are the same character), and tree2edges() gives the edges train.py builds the supergraph from.
+Every script of this folder imports them from here; scripts/exploration/lemmas.py must stay the same.
+"""
+
+import unicodedata
+
+
+def normalize(lemma):
+    return unicodedata.normalize('NFC', lemma)
+
+
+def tree2edges(t):
+    lst = []
+    for branch in t.productions(): # NLTK method to return the grammar productions, filtered by the left-hand side or the first item in the right-hand side.
+        leaf = str(branch).split('->') # arrows are in the t.production object by NLTK
+        row = leaf[1].strip().split(' ')
+        for r in row:
+            lst.append((leaf[0].strip(), r.strip("'")))
+    return lst
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Dry-run capacity planner used by train.py --plan
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+Estimates how much memory and time a node2vec run will need on a given supergraph (its CSR arrays, see walks.build_csr),
+without computing anything but the node degrees. The transition tables (see walks.py) hold, for every directed edge t ->
+v, one entry per neighbour of v, so they grow with the sum of squared degrees: a handful of hubs can account for most of
+it. They are memory-mapped, so all walk workers share one copy, and they are only built once per supergraph and p, q.
+Every worker holds one walk shard at a time; finished shards are read back from disk by Word2Vec. With MEMORY_LIMIT set
+in train.py, the supergraph and the tables stay on disk, are built in chunks and each worker only reads one partition of
+them at a time (see walks.py), so they count for the partition size rather than their full size. The estimates are rough
+and based on array sizes and per-step costs of the numpy implementation; adjust the constants below if your machine is
+very different.
+"""
+
+import os
+
+import numpy as np
+
+from walks import ENTRY_BYTES, graph_meta
+
+GB = 1024 ** 3
+
+# Memory, in bytes
+RUNTIME_BYTES = 512 * 1024 ** 2 # Python, numpy and gensim themselves, and the parsed trees
+GRAPH_NODE_BYTES = 150 # CSR row pointer, degree and vocabulary id, str(id) label and the build's counts of a node
+GRAPH_EDGE_BYTES = 200 # without MEMORY_LIMIT: CSR entries, table offsets and reverse index (both directions, mapped in
+                       # full) and the temporary arrays of building them
+PROBABILITY_BYTES = 4 # one float32 in the transition tables
+TOKEN_BYTES = 4 # one int32 node in a walk shard
+WALKER_NODE_BYTES = 100 # per-walk state while a shard is generated (positions, random numbers, search bounds)
+W2V_WORD_BYTES = 300 # vocabulary entry (key_to_index, index_to_key, counts, cum_table...)
+
+# Time, in seconds
+PRECOMPUTE_ENTRY_SECONDS = 0.3e-6 # per transition probability
+WALK_STEP_SECONDS = 0.3e-6 # per walk step (one vectorized binary search)
+W2V_WORDS_PER_SECOND = 200000 # per Word2Vec worker
+
+
+def _walk_bytes(nodes, params, workers, num_shards):
+    shard_walks = -(-params['num_walks'] // num_shards) # walks per node in the largest shard
+    return min(workers, num_shards) * nodes * shard_walks * (params['walk_length'] * TOKEN_BYTES + WALKER_NODE_BYTES)
+
+
+def build_memory(size, params):
+    """
+    Bytes the temporary arrays of walks.build_csr may take, for a vocabulary of size labels, for the build to stay
+    within params['memory_limit'] (GB).
+    """
+    available = params['memory_limit'] * GB - RUNTIME_BYTES - size * GRAPH_NODE_BYTES
+    if available <= 0:
+        raise ValueError('MEMORY_LIMIT = {} GB is too small to build a supergraph over {} labels'.format(
+            params['memory_limit'], size))
+    return int(available)
+
+
+def walk_memory(nodes, params, workers=None, num_shards=None):
+    """
+    Bytes of adjacency and transition tables each walk worker may hold at a time (and the builds of the tables may
+    take) for the whole run to stay within params['memory_limit'] (GB). The supergraph itself stays on disk. Raises
+    ValueError if the rest of the run does not fit in it on its own.
+    """
+    workers = params['workers'] if workers is None else workers
+    num_shards = params['num_shards'] if num_shards is None else num_shards
+    limit = params['memory_limit'] * GB
+    fixed = RUNTIME_BYTES + nodes * GRAPH_NODE_BYTES
+    available = limit - fixed - _walk_bytes(nodes, params, workers, num_shards)
+    if available <= 0 or limit - fixed < nodes * (W2V_WORD_BYTES + 2 * 4 * params['dimensions']):
+        raise ValueError('MEMORY_LIMIT = {} GB is too small for a supergraph of {} nodes even without its transition '
+                         'tables (see train.py --plan)'.format(params['memory_limit'], nodes))
+    return int(available // min(workers, num_shards))
+
+
+def estimate(degrees, num_edges, params, workers=None, num_shards=None):
+    """Memory (bytes) and time (seconds) of each stage, for the given degrees of the present nodes."""
+    workers = params['workers'] if workers is None else workers
+    num_shards = params['num_shards'] if num_shards is None else num_shards
+    nodes = len(degrees)
+    sum_squares = int((degrees.astype(np.float64) ** 2).sum())
+    tokens = nodes * params['num_walks'] * params['walk_length']
+
+    tables = sum_squares * PROBABILITY_BYTES # memory-mapped: one copy shared by all workers
+    graph = nodes * GRAPH_NODE_BYTES + num_edges * GRAPH_EDGE_BYTES
+    if params.get('memory_limit') is not None:
+        # Out of core: the supergraph stays on disk and each worker only holds one partition at a time
+        tables = min(tables, min(workers, num_shards) * walk_memory(nodes, params, workers, num_shards))
+        graph = nodes * GRAPH_NODE_BYTES
+    memory = {
+        'runtime': RUNTIME_BYTES,
+        'graph': graph,
+        'transition tables': tables,
+        'walks': _walk_bytes(nodes, params, workers, num_shards),
+        'word2vec': nodes * (W2V_WORD_BYTES + 2 * 4 * params['dimensions']),
+    }
+    time = {
+        'transition tables': sum_squares * PRECOMPUTE_ENTRY_SECONDS, # only the first time, then they are reused
+        'walks': tokens * WALK_STEP_SECONDS / min(workers, num_shards),
+        'word2vec': tokens * params['epochs'] / (W2V_WORDS_PER_SECOND * workers), # at most, with early stopping
+    }
+    return memory, time
+
+
+def _partitions(degrees, memory):
+    """Rough number of partitions the rows of the supergraph are split into with memory bytes per partition."""
+    rows = degrees.sum() * ENTRY_BYTES + (degrees.astype(np.float64) ** 2).sum() * PROBABILITY_BYTES
+    return int(np.ceil(rows / memory))
+
+
+def _format_seconds(seconds):
+    if seconds < 120:
+        return '{:.0f}s'.format(seconds)
+    if seconds < 7200:
+        return '{:.0f}min'.format(seconds / 60)
+    return '{:.1f}h'.format(seconds / 3600)
+
+
+def report(name, graph, labels, params, budget=None):
+    """
+    Print the plan for the supergraph in the folder graph (see walks.build_csr; node ids index labels) and, given a
+    memory budget in GB, settings that fit in it.
+    """
+    num_edges = graph_meta(graph)['edges']
+    present = np.load(os.path.join(graph, 'nodes.npy'))
+    degrees = np.diff(np.load(os.path.join(graph, 'indptr.npy')))
+
+    print('\n=== {} ==='.format(name))
+    print('Nodes: {}   Edges: {}'.format(len(present), num_edges))
+    if len(present) == 0:
+        return
+    print('Degree: min {}  median {:.0f}  mean {:.1f}  p99 {:.0f}  max {}'.format(
+        degrees.min(), np.median(degrees), degrees.mean(), np.percentile(degrees, 99), degrees.max()))
+    print('Degree distribution:')
+    buckets = np.floor(np.log2(degrees)).astype(int)
+    for bucket, count in zip(*np.unique(buckets, return_counts=True)):
+        print('    {:>8} - {:<8} {:>10} nodes'.format(2 ** bucket, 2 ** (bucket + 1) - 1, count))
+
+    squares = degrees.astype(np.float64) ** 2
+    hubs = np.argsort(-degrees, kind='stable')[:10]
+    print('Largest hubs (share of transition tables):')
+    for h in hubs:
+        print('    {!r:<20} degree {:>8}  {:5.1f}%'.format(labels[present[h]], degrees[h], 100 * squares[h] / squares.sum()))
+
+    try:
+        memory, time = estimate(degrees, num_edges, params)
+    except ValueError as e:
+        print(e)
+        return
+    print('Estimated memory and time with workers={}, num_walks={}, walk_length={}, num_shards={}, dimensions={}:'.format(
+        params['workers'], params['num_walks'], params['walk_length'], params['num_shards'], params['dimensions']))
+    for stage in memory:
+        print('    {:<18} {:8.2f} GB   {}'.format(stage, memory[stage] / GB,
+                                                 _format_seconds(time[stage]) if stage in time else ''))
+    print('    {:<18} {:8.2f} GB   {}'.format('total', sum(memory.values()) / GB, _format_seconds(sum(time.values()))))
+    print('Disk: {:.2f} GB of transition tables, {:.2f} GB of walk shards'.format(
+        squares.sum() * PROBABILITY_BYTES / GB, len(present) * params['num_walks'] * params['walk_length'] * TOKEN_BYTES / GB))
+    if params.get('memory_limit') is not None:
+        print('MEMORY_LIMIT = {} GB: about {} partitions per walk worker (walks take longer the more partitions there '
+              'are, as they wait for theirs to be read)'.format(params['memory_limit'], _partitions(
+                  degrees, walk_memory(len(present), params))))
+
+    if budget is not None:
+        suggest(degrees, num_edges, labels, present, params, budget)
+
+
+def suggest(degrees, num_edges, labels, present, params, budget):
+    budget_bytes = budget * GB
+    print('Suggestions for a {:g} GB budget:'.format(budget))
+    in_memory = dict(params, memory_limit=None)
+
+    # What no setting can do without: the runtime, the nodes, one walk per node in one worker and the Word2Vec vectors
+    nodes = len(degrees)
+    floor = (RUNTIME_BYTES + nodes * GRAPH_NODE_BYTES + _walk_bytes(nodes, params, 1, params['num_walks']) +
+             nodes * (W2V_WORD_BYTES + 2 * 4 * params['dimensions']))
+    if floor > budget_bytes:
+        print('    Nothing fits: {:g} GB is below the {:.2f} GB the runtime, the nodes, the walks and Word2Vec need '
+              'at the very least, whatever the settings and the transition tables'.format(budget, floor / GB))
+        return
+
+    fitting = [w for w in range(1, (os.cpu_count() or 1) + 1)
+               if sum(estimate(degrees, num_edges, in_memory, workers=w)[0].values()) <= budget_bytes]
+    if len(fitting) != 0:
+        workers = max(fitting)
+        memory, time = estimate(degrees, num_edges, in_memory, workers=workers)
+        print('    WORKERS = {} fits ({:.2f} GB, about {})'.format(workers, sum(memory.values()) / GB,
+                                                                  _format_seconds(sum(time.values()))))
+        return
+
+    # Not even one worker fits: the shard in memory shrinks with the number of shards, down to one walk per node.
+    # Fewer walks per node (NUM_WALKS) shrink it the same way, but also give Word2Vec less to learn from.
+    num_shards = params['num_walks']
+    memory, time = estimate(degrees, num_edges, in_memory, workers=1, num_shards=num_shards)
+    if num_shards > params['num_shards'] and sum(memory.values()) <= budget_bytes:
+        print('    WORKERS = 1 and NUM_SHARDS = {} (instead of {}) fit ({:.2f} GB, about {})'.format(
+            num_shards, params['num_shards'], sum(memory.values()) / GB, _format_seconds(sum(time.values()))))
+        fewer = [n for n in range(params['num_walks'] - 1, 0, -1)
+                 if sum(estimate(degrees, num_edges, dict(in_memory, num_walks=n), workers=1)[0].values())
+                 <= budget_bytes]
+        if len(fewer) != 0:
+            print('    or WORKERS = 1 and NUM_WALKS = {} (instead of {}), keeping NUM_SHARDS = {}'.format(
+                fewer[0], params['num_walks'], params['num_shards']))
+        return
+
+    # The transition tables do not fit in memory: read them from disk one partition at a time, as long as the largest
+    # hub's rows fit in a partition
+    out_of_core = dict(params, memory_limit=budget)
+    largest = degrees.max() * ENTRY_BYTES + float(degrees.max()) ** 2 * PROBABILITY_BYTES
+    for shards in sorted({params['num_shards'], num_shards}):
+        try:
+            partition = walk_memory(len(degrees), out_of_core, workers=1, num_shards=shards)
+        except ValueError:
+            continue
+        if partition >= largest:
+            print('    MEMORY_LIMIT = {}, WORKERS = 1 and NUM_SHARDS = {} fit: the transition tables are read from disk '
+                  'in about {} partitions'.format(budget, shards, _partitions(degrees, partition)))
+            return
+
+    # Even then the hubs do not fit: they have to be dealt with before training. Each removed hub frees at least its
+    # squared degree in probabilities.
+    excess = sum(memory.values()) - budget_bytes
+    freed = np.cumsum(np.sort(degrees.astype(np.float64) ** 2)[::-1]) * PROBABILITY_BYTES
+    drop = min(int(np.searchsorted(freed, excess)) + 1, len(freed))
+    order = np.argsort(-degrees, kind='stable')[:drop]
+    print('    The transition tables alone do not fit. Removing (or splitting) the {} nodes with degree >= {} '
+          'would free about {:.2f} GB, e.g.: {}'.format(
+              drop, degrees[order[-1]], freed[drop - 1] / GB, ', '.join(repr(labels[present[h]]) for h in order[:10])))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+Shared edge store and per-subcorpus training jobs used by train.py
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated)
+
+train.py parses trees.txt once and stores the edges of every tree as pairs of integer ids into one vocabulary shared
+by all subcorpora (EdgeStore). The ids are the ones of the persistent vocab.txt written by the converters (new labels,
+such as the empty node NLTK gives every leaf, are appended to it), so they are stable across runs. A subcorpus
+supergraph is then just the union of the edges of its trees, which is the same graph compose_all() would build from
+the corresponding tree graphs.
+
+A manifest maps the source files recorded in sources.txt (see mergetrees.py) to subcorpora. It is a tab-separated
+text file with one '<path or glob pattern>\t<subcorpus>' pair per line, e.g.:
+
+    # period
+    ./AGDT_treebanks/tlg0012*    archaic
+    ./AGDT_treebanks/tlg0059*    classical
+    # treebank
+    ./PROIEL_treebanks/*         proiel
+
+Lines starting with # are ignored. A source can belong to more than one subcorpus.
+"""
+
+from array import array
+from fnmatch import fnmatch
+from functools import partial
+import json
+import os
+
+from gensim.models import KeyedVectors
+import numpy as np
+
+from checkpoint import check_meta, fit_with_checkpoints, walk_shards
+from convergence import ConvergenceMonitor
+from lemmas import normalize
+import plan
+from walks import WalkCorpus, build_csr, graph_meta, transition_tables
+
+
+CHECK_CHUNK = 1 << 22 # edges checked at once when a saved store is loaded
+
+
+def read_manifest(path):
+    """Return a list of (pattern, subcorpus) pairs, in file order."""
+    manifest = []
+    with open(path, 'r') as intxt:
+        for n, line in enumerate(intxt.readlines(), 1):
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            if len(parts) != 2:
+                raise ValueError('{}, line {}: expected "<source pattern>\\t<subcorpus>", got {!r}'.format(path, n, line))
+            manifest.append((parts[0].strip(), parts[1].strip()))
+    return manifest
+
+
+def assign_subcorpora(sources, manifest):
+    """Map each subcorpus in the manifest to the (sorted) indices of the trees whose source matches it."""
+    matches = {}
+    for source in set(sources):
+        matches[source] = [subcorpus for pattern, subcorpus in manifest if source == pattern or fnmatch(source, pattern)]
+
+    subcorpora = {subcorpus: [] for _, subcorpus in manifest}
+    for i, source in enumerate(sources):
+        for subcorpus in matches[source]:
+            subcorpora[subcorpus].append(i)
+    return {subcorpus: np.array(trees, dtype=np.int64) for subcorpus, trees in subcorpora.items()}
+
+
+class EdgeStore:
+    """
+    Edges of every tree as integer node ids, stored in one array with per-tree offsets. While trees are added the ids
+    are kept in a compact array of int64 (16 bytes per edge); a saved store is read back memory-mapped.
+    """
+
+    def __init__(self, vocab=None):
+        """vocab: the vocabulary written by the converters (see preprocess/vocab.py), whose ids are kept."""
+        self.labels = [] # id -> node label
+        if vocab is not None and os.path.exists(vocab):
+            with open(vocab, 'r') as intxt:
+                self.labels = [line.rstrip('\n') for line in intxt.readlines()]
+        self.ids = {label: i for i, label in enumerate(self.labels)} # node label -> id
+        self._edges = array('q') # head, dependent, head, dependent...
+        self._offsets = array('q', [0])
+
+    def index(self, label):
+        label = normalize(label) # trees converted before the vocabulary existed may not be normalized yet
+        i = self.ids.get(label)
+        if i is None:
+            i = self.ids[label] = len(self.labels)
+            self.labels.append(label)
+        return i
+
+    def add_tree(self, pairs):
+        for head, dep in pairs:
+            self._edges.append(self.index(head))
+            self._edges.append(self.index(dep))
+        self._offsets.append(len(self._edges) // 2)
+
+    def freeze(self):
+        self.edges = np.frombuffer(self._edges, dtype=np.int64).reshape(-1, 2)
+        self.offsets = np.frombuffer(self._offsets, dtype=np.int64)
+
+    def save(self, folder, vocab):
+        """
+        Save the edges as folder/edges.npy and folder/tree-offsets.npy, and the labels as vocab. Every file is written
+        aside and moved into place, edges.npy last, so a killed run never leaves a newer edges.npy than its offsets.
+        """
+        edges, offsets = os.path.join(folder, 'edges.npy'), os.path.join(folder, 'tree-offsets.npy')
+        for path, values in ((edges, self.edges), (offsets, self.offsets)):
+            with open(path + '.tmp', 'wb') as out:
+                np.save(out, values)
+        with open(vocab + '.tmp', 'w') as outtxt: # labels are only ever appended, so old ids stay valid meanwhile
+            for label in self.labels:
+                outtxt.write(label + '\n')
+        os.replace(offsets + '.tmp', offsets)
+        os.replace(vocab + '.tmp', vocab)
+        os.replace(edges + '.tmp', edges)
+
+    @classmethod
+    def load(cls, folder, vocab):
+        """The store saved in folder, with the edges memory-mapped. Raises ValueError if its files do not match."""
+        store = cls(vocab)
+        store.edges = np.load(os.path.join(folder, 'edges.npy'), mmap_mode='r')
+        store.offsets = np.load(os.path.join(folder, 'tree-offsets.npy'))
+        del store._edges, store._offsets
+        if len(store.offsets) == 0 or store.offsets[-1] != len(store.edges):
+            raise ValueError('{}: tree-offsets.npy does not match edges.npy'.format(folder))
+        for start in range(0, len(store.edges), CHECK_CHUNK):
+            if store.edges[start:start + CHECK_CHUNK].max() >= len(store.labels):
+                raise ValueError('{}: edges.npy has ids beyond the {} labels of {}'.format(folder, len(store.labels),
+                                                                                           vocab))
+        return store
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def edge_chunks(self, trees, chunk):
+        """The edges of the given trees (all trees if None), as arrays of at most chunk edges (or one tree's)."""
+        if trees is None:
+            for start in range(0, len(self.edges), chunk):
+                yield np.asarray(self.edges[start:start + chunk])
+            return
+        trees = np.asarray(trees, dtype=np.int64)
+        starts = self.offsets[trees]
+        sizes = self.offsets[trees + 1] - starts
+        before = np.concatenate([[0], np.cumsum(sizes)]) # edges of the selected trees before each of them
+        i = 0
+        while i < len(trees):
+            j = max(i + 1, int(np.searchsorted(before, before[i] + chunk, side='right')) - 1)
+            rows = np.repeat(starts[i:j] - before[i:j], sizes[i:j]) + np.arange(before[i], before[j])
+            yield self.edges[rows]
+            i = j
+
+    def supergraph(self, directory, trees=None, memory=None):
+        """
+        Write the CSR arrays of the union of the given trees (all trees if None) to directory (see walks.build_csr)
+        and return it. memory: bytes the build may use (None: no limit).
+        """
+        build_csr(directory, partial(self.edge_chunks, trees), len(self.labels), memory)
+        return directory
+
+
+def train_graph(name, graph, labels, outdir, params, monitoring=None, tables_root='./outputs/transition-tables'):
+    """
+    Train one node2vec model on the supergraph whose CSR arrays are in the folder graph (see EdgeStore.supergraph;
+    node ids index labels) and save it under outdir. The supergraph stays on disk and is only memory-mapped.
+    monitoring: keyword arguments of convergence.ConvergenceMonitor, with lemmas as sentinels (None: no monitoring).
+    tables_root: where the transition tables are kept, so runs on the same graph with the same p and q share them.
+    This is a module-level function so that train.py can run several of these in a process pool.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    supergraph = graph_meta(graph)
+
+    checkpoints = os.path.join(outdir, 'checkpoints')
+    # Settings that change the result; workers, quiet and the memory limit can differ between a run and its resumption.
+    # The supergraph is identified by its content, so changed trees with the same numbers of nodes and edges do not
+    # reuse stale walk shards.
+    meta = {key: value for key, value in params.items() if key not in ('workers', 'quiet', 'memory_limit')}
+    check_meta(checkpoints, dict(meta, supergraph=supergraph['fingerprint']))
+
+    memory = None
+    if params['memory_limit'] is not None:
+        memory = plan.walk_memory(supergraph['nodes'], params)
+        print('{}: walks will hold at most {:.2f} GB of the supergraph per worker'.format(name, memory / plan.GB))
+
+    print('{}: now n2v on {} nodes and {} edges...'.format(name, supergraph['nodes'], supergraph['edges']))
+    tables = transition_tables(tables_root, graph, params['p'], params['q'], memory)
+    shards = walk_shards(tables, checkpoints, params['num_walks'], params['walk_length'], params['num_shards'],
+                         params['seed'], params['workers'], params['quiet'], memory)
+    walks = WalkCorpus(shards, [str(i) for i in np.load(os.path.join(graph, 'nodes.npy'))])
+
+    monitor = None
+    if monitoring is not None:
+        ids = {label: i for i, label in enumerate(labels)}
+        sentinels = [str(ids[s]) for s in map(normalize, monitoring['sentinels']) if s in ids]
+        monitor = ConvergenceMonitor(**dict(monitoring, sentinels=sentinels))
+
+    print('{}: now Word2Vec...'.format(name))
+    mdl, state = fit_with_checkpoints(
+        walks,
+        checkpoints,
+        monitor,
+        vector_size=params['dimensions'],
+        window=params['window'],
+        min_count=params['min_count'],
+        batch_words=params['batch_words'],
+        sg=1,
+        workers=params['workers'],
+        epochs=params['epochs'],
+        seed=params['seed']
+    )
+
+    # Walks (and therefore the Word2Vec keys) are node ids: translate them back to labels only here
+    ids = np.array([int(key) for key in mdl.wv.index_to_key], dtype=np.int64)
+    wv = KeyedVectors(mdl.wv.vector_size)
+    wv.add_vectors([labels[i] for i in ids], mdl.wv.vectors)
+    wv.save_word2vec_format(os.path.join(outdir, 'min{}-n2v-model.txt'.format(params['window'])), binary=False)
+
+    # Same rows as the shared vocab.txt for every subcorpus, so models can be compared row by row
+    vectors = np.zeros((len(labels), mdl.wv.vector_size), dtype=np.float32)
+    present = np.zeros(len(labels), dtype=bool)
+    vectors[ids] = mdl.wv.vectors
+    present[ids] = True
+    np.savez(os.path.join(outdir, 'aligned-vectors.npz'), vectors=vectors, present=present)
+
+    # Where training stopped, and roughly how much time stopping early saved
+    seconds = state['epoch_seconds']
+    with open(os.path.join(outdir, 'training.json'), 'w') as outtxt:
+        json.dump({
+            'epochs': state['epochs'],
+            'epochs_run': state['epochs_done'],
+            'stopped_early': state['stopped'],
+            'seconds': sum(seconds),
+            'seconds_saved': (state['epochs'] - state['epochs_done']) * sum(seconds) / len(seconds) if seconds else 0,
+            'epoch_seconds': seconds,
+            'losses': state['monitor']['losses'] if state['monitor'] else None,
+            'chunk_losses': state['monitor']['chunk_losses'] if state['monitor'] else None,
+            'sentinel_stability': state['monitor']['stability'] if state['monitor'] else None,
+        }, outtxt, indent=2)
+    return name
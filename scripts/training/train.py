@@ -7,12 +7,15 @@ Main script to train Ancient Greek node2vec models from parenthetical/parse tree
 --------------------
 
 Author: Nilo Pedrazzini. 'SuperGraph' method (merging all parse trees into one big network prior to training node2vec) is adapted
-        from the technique described in Ragheb Al-Ghezi and Mikko Kurimo. 2020. Graph-based Syntactic Word Embeddings. 
-        In Proceedings of the Graph-based Methods for Natural Language Processing (TextGraphs), pages 72–78, 
+        from the technique described in Ragheb Al-Ghezi and Mikko Kurimo. 2020. Graph-based Syntactic Word Embeddings.
+        In Proceedings of the Graph-based Methods for Natural Language Processing (TextGraphs), pages 72–78,
         Barcelona, Spain (Online). Association for Computational Linguistics. DOI: 10.18653/v1/2020.textgraphs-1.8
 
 How to run:
     $ python train.py
+    $ python train.py --manifest manifest.tsv --jobs 4 # one model per subcorpus (see subcorpora.py for the format)
+    $ python train.py --plan --memory-budget 64 # only report the expected memory and time (see plan.py)
+    Set MEMORY_LIMIT below to train on supergraphs whose transition tables do not fit in memory (see walks.py).
 
 Before running this script, you need to:
     - have run xml-to-parenth-agdt.py and xml-to-parenth-proiel.py as appropriate
@@ -20,79 +23,164 @@ Before running this script, you need to:
 
 Returns:
     ./outputs/nameofmodel/model (model): node2vec model
+    ./outputs/nameofmodel/checkpoints/ (dir): walk shards, Word2Vec state after each epoch and RNG state. If the job
+                                              dies, running the script again with the same model name resumes from here.
+    ./outputs/transition-tables/ (dir): node2vec transition tables, one folder per supergraph and P, Q (see walks.py).
+                                        Reused by every later run on the same supergraph; safe to delete.
+    ./outputs/nameofmodel/vocab.txt (file): the converters' lemma vocabulary, with any other node labels appended;
+                                            row i of every aligned-vectors.npz is line i
+    ./outputs/nameofmodel/edges.npy, tree-offsets.npy (files): edges of every tree as ids into vocab.txt, and the
+                                                               first edge of each tree; reused while trees.txt is
+                                                               unchanged
+    ./outputs/nameofmodel/supergraph/ (dir): CSR arrays of the supergraph, memory-mapped while training (see walks.py)
+    ./outputs/nameofmodel/aligned-vectors.npz (file): vectors as a matrix aligned to vocab.txt ('vectors', 'present')
+    ./outputs/nameofmodel/training.json (file): epochs run, why training stopped early (if it did), time taken and
+                                                saved, and the loss and sentinel neighbour stability per epoch
+    With --manifest, each subcorpus gets its own ./outputs/nameofmodel/subcorpusname/ folder with the files above
+    (except vocab.txt and the edges, which are shared).
 
 """
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import resource
+
 from nltk import Tree
-from networkx.algorithms.operators.all import compose_all
-import networkx as nx
-import pandas as pd
 from tqdm import tqdm
-from node2vec import Node2Vec as n2v
-
-modelname = input('Enter name of the model (i.e. the folder with the preprocessed/parenthetical texts: ')
-
-trees = './outputs/{}/trees.txt'.format(modelname)
-
-listofss = []
-with open(trees,'r') as intxt:
-    for line in tqdm(intxt.readlines()):
-        listofss.append(Tree.fromstring(line))
-
-def tree2graph(t):
-    lst = []
-    G = nx.Graph() # for each t initialize a graph object
-    for branch in t.productions(): # NLTK method to return the grammar productions, filtered by the left-hand side or the first item in the right-hand side.
-        leaf = str(branch).split('->') # arrows are in the t.production object by NLTK
-        row = leaf[1].strip().split(' ')
-        for r in row:
-            lst.append((leaf[0].strip(), r.strip("'")))
-
-    G.add_edges_from(lst)
-    return G
-
-
-forcomposeall = []
-for s in tqdm(listofss):
-    news = tree2graph(s)
-    forcomposeall.append(news)
-
-print('Now composing_all...')
 
-supergraph = compose_all(forcomposeall)
-# supergraph = compose_all([tree2graph(s) for s in listofss])
-
-options = {
-    'node_color': 'green',
-    'node_size': 500,
-    'arrowstyle': '-|>',
-    'arrowsize': 5,
-}
-
-print('Now n2v...')
-
-g_emb = n2v(supergraph, dimensions=16) # train node2vec model based on graph trees
+from lemmas import tree2edges
+import plan
+from subcorpora import EdgeStore, assign_subcorpora, read_manifest, train_graph
 
+DIMENSIONS = 16 # Node2Vec dimensions
+WALK_LENGTH = 80 # Node2Vec walk length
+NUM_WALKS = 10 # Node2Vec walks per node
+P = 1 # Node2Vec return parameter
+Q = 1 # Node2Vec in-out parameter
+WORKERS = 1 # Walk and Word2Vec workers; walks are the same with any number, Word2Vec is only reproducible with 1
 WINDOW = 5 # Node2Vec fit window
 MIN_COUNT = 1 # Node2Vec min. count
 BATCH_WORDS = 4 # Node2Vec batch words
-
-print('Now g_emb.fit...')
-
-mdl = g_emb.fit(
-    vector_size = 16,
-    window=WINDOW,
-    min_count=MIN_COUNT,
-    batch_words=BATCH_WORDS
-)
-
-emb_df = (
-    pd.DataFrame(
-        [mdl.wv.get_vector(str(n)) for n in supergraph.nodes()],
-        index = supergraph.nodes
-    )
-)
-
-mdl.wv.save_word2vec_format('./outputs/{}/min{}-n2v-model.txt'.format(modelname,str(WINDOW)), binary=False) # Also save the vectors only (easier to work with) - Not necessary, of course
-
-# mdl.save('./outputs/{}/min{}-n2v-model'.format(modelname,str(WINDOW))) # save model (can be queried the same as w2v)
\ No newline at end of file
+SEED = 42 # Seed for walks and Word2Vec; a resumed run gives the same model as an uninterrupted one with the same seed
+NUM_SHARDS = 10 # Walks are generated (and checkpointed) in this many shards
+EPOCHS = 5 # Word2Vec epochs (at most, with early stopping)
+MEMORY_LIMIT = None # GB the run may use (shared by the --jobs); the transition tables are then read in partitions
+
+# Convergence monitoring (see convergence.py); set MONITOR = False to train all EPOCHS without tracking the loss
+MONITOR = True
+SENTINELS = ['κακός', 'πατήρ'] # Lemmas whose neighbours are compared after every epoch
+TOPN = 10 # Neighbours compared per sentinel
+LOSS_TOLERANCE = 0.01 # Stop when an epoch lowers (not raises) the loss by less than this fraction (None: ignore it)
+STABILITY = 0.9 # Stop when the sentinels keep at least this share of their neighbours (None: ignore them)
+LOSS_CHUNK = 1000000 # Record the running loss every this many words (walk steps) within an epoch
+
+
+def limit_memory(gb):
+    # Hard ceiling: allocations beyond it fail with MemoryError instead of pushing the machine into swap. Memory-mapped
+    # files (transition tables, walk shards) do not count, as their pages can always be dropped and read again.
+    limit = int(gb * plan.GB)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train node2vec models from parenthetical/parse trees')
+    parser.add_argument('--manifest', help='tab-separated file mapping source files to subcorpora (one model each)')
+    parser.add_argument('--jobs', type=int, default=1, help='number of subcorpus models trained in parallel')
+    parser.add_argument('--plan', action='store_true', help='only build the supergraph(s) and report memory/time estimates')
+    parser.add_argument('--memory-budget', type=float, help='with --plan, memory (GB) to suggest settings for')
+    args = parser.parse_args()
+
+    modelname = input('Enter name of the model (i.e. the folder with the preprocessed/parenthetical texts: ')
+
+    folder = './outputs/{}'.format(modelname)
+    trees = os.path.join(folder, 'trees.txt')
+
+    cache = os.path.join(folder, 'edges.npy')
+    vocab = os.path.join(folder, 'vocab.txt')
+
+    store = None
+    if os.path.exists(cache) and os.path.exists(vocab) and os.path.getmtime(cache) >= os.path.getmtime(trees):
+        print('Reading the parsed trees from {}'.format(cache))
+        try:
+            store = EdgeStore.load(folder, vocab)
+        except (OSError, ValueError) as e:
+            print('{}; parsing the trees again'.format(e))
+    if store is None:
+        # Parse once: every tree's edges go into one store indexed by the vocabulary, shared by all subcorpora
+        store = EdgeStore(vocab)
+        with open(trees,'r') as intxt:
+            for line in tqdm(intxt):
+                store.add_tree(tree2edges(Tree.fromstring(line)))
+        store.freeze()
+        store.save(folder, vocab)
+        del store
+        store = EdgeStore.load(folder, vocab) # the edges are memory-mapped from here on
+
+    params = {
+        'dimensions': DIMENSIONS,
+        'window': WINDOW,
+        'min_count': MIN_COUNT,
+        'batch_words': BATCH_WORDS,
+        'seed': SEED,
+        'num_shards': NUM_SHARDS,
+        'walk_length': WALK_LENGTH,
+        'num_walks': NUM_WALKS,
+        'p': P,
+        'q': Q,
+        'workers': WORKERS,
+        'epochs': EPOCHS,
+        'memory_limit': None if MEMORY_LIMIT is None else MEMORY_LIMIT / args.jobs, # per job, as they run side by side
+        'quiet': args.manifest is not None # progress bars from parallel jobs would only garble each other
+    }
+    monitoring = None
+    if MONITOR:
+        monitoring = {'sentinels': SENTINELS, 'topn': TOPN, 'loss_tolerance': LOSS_TOLERANCE, 'stability': STABILITY,
+                      'loss_chunk': LOSS_CHUNK}
+
+    if params['memory_limit'] is not None and not args.plan:
+        limit_memory(params['memory_limit'])
+    # The supergraphs are built from the edges in groups of rows that fit in the memory limit, straight to disk
+    build = None if params['memory_limit'] is None else plan.build_memory(len(store.labels), params)
+    labels = store.labels
+
+    if args.manifest is None:
+        graph = store.supergraph(os.path.join(folder, 'supergraph'), memory=build)
+        del store # the walks and Word2Vec only need the supergraph's files
+        if args.plan:
+            plan.report(modelname, graph, labels, params, args.memory_budget)
+        else:
+            train_graph(modelname, graph, labels, folder, params, monitoring)
+        return
+
+    with open('./outputs/{}/sources.txt'.format(modelname), 'r') as intxt:
+        sources = [line.rstrip('\n') for line in intxt.readlines()]
+    if len(sources) != len(store):
+        raise ValueError('sources.txt has {} lines but trees.txt has {}: rerun mergetrees.py'.format(len(sources), len(store)))
+
+    subcorpora = assign_subcorpora(sources, read_manifest(args.manifest))
+    graphs = {}
+    for subcorpus, indices in subcorpora.items():
+        print('{}: {} trees'.format(subcorpus, len(indices)))
+        graphs[subcorpus] = store.supergraph(os.path.join(folder, subcorpus, 'supergraph'), indices, build)
+    del store
+
+    if args.plan:
+        # The jobs run side by side, so each gets its share of the budget
+        budget = None if args.memory_budget is None else args.memory_budget / args.jobs
+        for subcorpus in subcorpora:
+            plan.report(subcorpus, graphs[subcorpus], labels, params, budget)
+        return
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(train_graph, subcorpus, graphs[subcorpus], labels, os.path.join(folder, subcorpus), params,
+                        monitoring)
+            for subcorpus, indices in subcorpora.items() if len(indices) != 0
+        ]
+        for future in as_completed(futures):
+            print('{}: done'.format(future.result()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+--------------------
+node2vec random walks over persisted, memory-mapped transition tables
+--------------------
+
+Author: Nilo Pedrazzini (unless otherwise stated). Walks follow Aditya Grover and Jure Leskovec. 2016. node2vec:
+        Scalable Feature Learning for Networks. In Proceedings of the 22nd ACM SIGKDD International Conference on
+        Knowledge Discovery and Data Mining.
+
+The supergraph is stored as CSR arrays (indptr, indices: the neighbours of node i are indices[indptr[i]:indptr[i+1]],
+sorted), written to .npy files by build_csr from edges read a chunk at a time. node2vec's second-order walk needs,
+for every directed edge t -> v, a distribution over the neighbours x of v: weight 1/p if x is t, 1 if x is also a
+neighbour of t, 1/q otherwise. These tables are stored as one flat array of cumulative distributions, so they can be
+built with numpy, a chunk of entries at a time, and sampled for many walks at once with a vectorized binary search.
+The table of t -> v belongs to the CSR entry of t in the row of v (cdf[offsets[k]:offsets[k+1]] for that entry k), so
+everything a walk standing on v needs is in the rows of v: its neighbours, its tables and, for each neighbour, the
+entry pointing back to v in the neighbour's row (reverse). The first step of a walk is uniform over the neighbours,
+as the supergraph is unweighted.
+
+The tables are saved as .npy files under tables_root/<fingerprint of the CSR arrays>-p<p>-q<q>/ and loaded with
+mmap_mode='r': a later run on the same supergraph with the same p and q (e.g. only changing Word2Vec settings) loads
+them instantly, and all walk worker processes share the same read-only pages.
+
+With a memory limit, the CSR arrays and the tables are built in chunks that fit in it, straight into memory-mapped
+files, and the nodes are split into consecutive partitions whose rows (adjacency and tables) fit in the given number
+of bytes. Only one partition is read into memory at a time, and each walk is advanced until it leaves the partition;
+the other walks wait for their partition to come round. The random numbers of a walk step only depend on the seed,
+the walk and the step, so the walks are the same whatever the partitions (and the number of workers).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+CHUNK = 1 << 24 # transition table entries computed at once while building the tables (at most)
+BUILD_ENTRY_BYTES = 150 # temporary arrays per table entry while building the tables
+CSR_CHUNK = 1 << 22 # edges read at once while building the CSR arrays (at most)
+CSR_EDGE_BYTES = 100 # temporary arrays per edge read at once while building the CSR arrays
+CSR_ENTRY_BYTES = 80 # temporary arrays per CSR entry of the rows being built (deduplicated as they are read)
+ENTRY_BYTES = 20 # indices (int32), reverse and offsets (int64) of one CSR entry in a partition
+PROBABILITY_BYTES = 4 # one float32 in the transition tables
+
+
+def _directed(edges):
+    """Both directions (src, dst) of the given edges; a self-loop is one neighbour, not two."""
+    loops = edges[:, 0] == edges[:, 1]
+    src = np.concatenate([edges[:, 0], edges[~loops, 1]])
+    dst = np.concatenate([edges[:, 1], edges[~loops, 0]])
+    return src, dst
+
+
+def build_csr(directory, read_edges, size, memory=None):
+    """
+    Write the CSR adjacency of an undirected graph to directory, as .npy files to be memory-mapped:
+        nodes.npy: the vocabulary id of each row
+        indptr.npy, indices.npy: row numbers, sorted and deduplicated within each row
+        meta.json: numbers of nodes, edges and entries, and a fingerprint of the three arrays
+    read_edges(chunk) must yield the edges (pairs of vocabulary ids < size, possibly repeated) at most chunk at a time;
+    it is called once per pass. The rows are built in groups whose entries fit in memory bytes (None: all at once),
+    with one pass over the edges per group, so the edges never have to be in memory all at once.
+    """
+    chunk = CSR_CHUNK if memory is None else max(1, min(CSR_CHUNK, memory // 2 // CSR_EDGE_BYTES))
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        os.remove(os.path.join(directory, 'meta.json')) # only written once the arrays are complete
+
+    # First pass: which ids are nodes, and how many neighbours each can have at most
+    counts = np.zeros(size, dtype=np.int64)
+    for edges in read_edges(chunk):
+        src, _ = _directed(np.asarray(edges))
+        counts += np.bincount(src, minlength=size)
+    nodes = np.flatnonzero(counts)
+    n = len(nodes)
+    local = np.full(size, -1, dtype=np.int64)
+    local[nodes] = np.arange(n)
+    cost = np.concatenate([[0], np.cumsum(np.minimum(counts[nodes], n))])
+    del counts
+
+    # Then one pass per group of rows, keeping only the entries of the group
+    group = None if memory is None else max(1, memory // 2 // CSR_ENTRY_BYTES)
+    degrees = np.zeros(n, dtype=np.int64)
+    num_edges = 0
+    raw = os.path.join(directory, 'indices.tmp')
+    with open(raw, 'wb') as out:
+        a = 0
+        while a < n:
+            b = n if group is None else max(a + 1, int(np.searchsorted(cost, cost[a] + group, side='right')) - 1)
+            keys = np.empty(0, dtype=np.int64) # src * n + dst, sorted and deduplicated
+            pending = []
+            waiting = 0
+            for edges in read_edges(chunk):
+                src, dst = _directed(local[np.asarray(edges)])
+                keep = (src >= a) & (src < b)
+                pending.append(src[keep] * n + dst[keep])
+                waiting += len(pending[-1])
+                if waiting >= max(len(keys), chunk): # deduplicate as we go, so repeated edges never pile up
+                    keys = np.unique(np.concatenate([keys] + pending))
+                    pending = []
+                    waiting = 0
+            keys = np.unique(np.concatenate([keys] + pending))
+            rows, cols = np.divmod(keys, n)
+            degrees[a:b] = np.bincount(rows - a, minlength=b - a)
+            num_edges += int((rows <= cols).sum())
+            out.write(cols.astype(np.int32).tobytes())
+            del keys, pending, rows, cols
+            a = b
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    np.save(os.path.join(directory, 'nodes.npy'), nodes)
+    np.save(os.path.join(directory, 'indptr.npy'), indptr)
+    # The fingerprint hashes the three arrays one after the other; indices are hashed as they are copied into place
+    digest = hashlib.sha1()
+    digest.update(nodes.tobytes())
+    digest.update(indptr.tobytes())
+    entries = int(indptr[-1])
+    if entries == 0:
+        np.save(os.path.join(directory, 'indices.npy'), np.empty(0, dtype=np.int32))
+    else:
+        indices = np.lib.format.open_memmap(os.path.join(directory, 'indices.npy'), mode='w+', dtype=np.int32,
+                                            shape=(entries,))
+        written = np.memmap(raw, dtype=np.int32, mode='r', shape=(entries,))
+        for start in range(0, entries, chunk):
+            block = np.array(written[start:start + chunk])
+            indices[start:start + chunk] = block
+            digest.update(block.tobytes())
+        indices.flush()
+        del indices, written
+    os.remove(raw)
+
+    with open(os.path.join(directory, 'meta.json'), 'w') as outtxt:
+        json.dump({'nodes': n, 'edges': num_edges, 'entries': entries, 'fingerprint': digest.hexdigest()}, outtxt)
+
+
+def graph_meta(directory):
+    """Numbers of nodes, edges and entries and the fingerprint of the CSR arrays written by build_csr."""
+    with open(os.path.join(directory, 'meta.json'), 'r') as intxt:
+        return json.load(intxt)
+
+
+def _search(values, lo, hi, targets):
+    """First position in [lo, hi) of each sorted segment of values with a value > target (hi if there is none)."""
+    lo = lo.copy()
+    hi = hi.copy()
+    last = len(values) - 1
+    while True:
+        active = lo < hi
+        if not active.any():
+            return lo
+        mid = (lo + hi) // 2
+        right = active & (values[np.minimum(mid, last)] <= targets)
+        lo = np.where(right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+
+
+def _build(directory, graph, p, q, chunk):
+    os.makedirs(directory)
+    for name in ('nodes', 'indptr', 'indices'): # copied, so the tables stay valid whatever happens to graph
+        shutil.copyfile(os.path.join(graph, name + '.npy'), os.path.join(directory, name + '.npy'))
+    indptr = np.load(os.path.join(directory, 'indptr.npy'))
+    indices = np.load(os.path.join(directory, 'indices.npy'), mmap_mode='r')
+    deg = np.diff(indptr)
+    entries = len(indices)
+
+    # The table of every CSR entry t in the row of v (t -> v) has one entry per neighbour of v
+    offsets = np.lib.format.open_memmap(os.path.join(directory, 'offsets.npy'), mode='w+', dtype=np.int64,
+                                        shape=(entries + 1,))
+    offsets[0] = 0
+    a = 0
+    while a < len(deg):
+        # As many rows as have chunk CSR entries (at least one)
+        b = max(a + 1, int(np.searchsorted(indptr, indptr[a] + chunk, side='right')) - 1)
+        offsets[indptr[a] + 1:indptr[b] + 1] = offsets[indptr[a]] + np.cumsum(np.repeat(deg[a:b], deg[a:b]))
+        a = b
+
+    # For the entry of t in the row of v, the entry of v in the row of t: rows are sorted, so a binary search finds it
+    if entries == 0:
+        np.save(os.path.join(directory, 'reverse.npy'), np.empty(0, dtype=np.int64))
+    else:
+        reverse = np.lib.format.open_memmap(os.path.join(directory, 'reverse.npy'), mode='w+', dtype=np.int64,
+                                            shape=(entries,))
+        for k in range(0, entries, chunk):
+            end = min(k + chunk, entries)
+            v = np.searchsorted(indptr, np.arange(k, end), side='right') - 1
+            t = indices[k:end].astype(np.int64)
+            reverse[k:end] = _search(indices, indptr[t], indptr[t + 1], v - 1)
+        reverse.flush()
+        del reverse
+
+    cdf = np.lib.format.open_memmap(os.path.join(directory, 'cdf.npy'), mode='w+', dtype=np.float32,
+                                    shape=(int(offsets[-1]),))
+    k = 0
+    while k < entries:
+        # As many edges as fit in chunk table entries (at least one)
+        end = max(k + 1, int(np.searchsorted(offsets, offsets[k] + chunk, side='right')) - 1)
+        src = np.searchsorted(indptr, np.arange(k, end), side='right') - 1 # v of the CSR entry t in the row of v
+        sizes = deg[src] # size of the table of each directed edge t -> v
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        j = np.arange(int(sizes.sum())) - np.repeat(starts, sizes) # position of each entry within its table
+        v = np.repeat(src, sizes)
+        t = np.repeat(indices[k:end].astype(np.int64), sizes)
+        x = indices[indptr[v] + j].astype(np.int64)
+
+        pos = _search(indices, indptr[t], indptr[t + 1], x - 1) # where x would be among the neighbours of t
+        neighbour = (pos < indptr[t + 1]) & (indices[np.minimum(pos, entries - 1)] == x)
+        weights = np.where(x == t, 1 / p, np.where(neighbour, 1.0, 1 / q))
+
+        cumulative = np.cumsum(weights)
+        before = np.concatenate([[0.0], cumulative])[starts] # cumulative weight before each table
+        totals = cumulative[starts + sizes - 1] - before
+        cdf[offsets[k]:offsets[end]] = (cumulative - np.repeat(before, sizes)) / np.repeat(totals, sizes)
+        k = end
+    cdf.flush()
+    total = int(offsets[-1])
+    del cdf, offsets, indices
+
+    with open(os.path.join(directory, 'meta.json'), 'w') as outtxt:
+        json.dump({'nodes': len(deg), 'entries': total, 'p': p, 'q': q}, outtxt)
+
+
+def _remove_stale(directory):
+    """Delete the half-built copies of these tables left by runs killed while building them."""
+    parent, name = os.path.split(directory)
+    if not os.path.isdir(parent):
+        return
+    for entry in os.listdir(parent):
+        if not entry.startswith(name + '.tmp-'):
+            continue
+        try:
+            pid = int(entry[len(name) + len('.tmp-'):])
+            if pid != os.getpid():
+                os.kill(pid, 0) # raises if the process that was building it is gone
+                continue # another job is building the same tables right now
+        except (ValueError, ProcessLookupError):
+            pass
+        except PermissionError: # the process exists, but belongs to another user
+            continue
+        shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def transition_tables(tables_root, graph, p, q, memory=None):
+    """
+    Directory with the tables of the supergraph in the folder graph (see build_csr) and p, q; built (and saved) only
+    if they are not there yet.
+    memory: bytes the temporary arrays of the build may take (None: no limit).
+    """
+    directory = os.path.join(tables_root, '{}-p{}-q{}'.format(graph_meta(graph)['fingerprint'], p, q))
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        print('Reusing the transition tables in {}'.format(directory))
+        return directory
+
+    print('Building the transition tables in {}...'.format(directory))
+    chunk = CHUNK if memory is None else max(1, min(CHUNK, memory // BUILD_ENTRY_BYTES))
+    _remove_stale(directory)
+    tmp = directory + '.tmp-{}'.format(os.getpid()) # built aside, so a killed run never leaves half a table
+    _build(tmp, graph, p, q, chunk)
+    try:
+        os.rename(tmp, directory)
+    except OSError: # another job built the same tables in the meantime
+        shutil.rmtree(tmp)
+    return directory
+
+
+def load_tables(directory):
+    return {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+            for name in ('nodes', 'indptr', 'indices', 'offsets', 'reverse', 'cdf')}
+
+
+def partitions(indptr, offsets, memory=None):
+    """Boundaries of consecutive node ranges whose rows (adjacency and tables) take at most memory bytes each."""
+    n = len(indptr) - 1
+    if memory is None:
+        return np.array([0, n])
+    # Bytes taken by the rows of all the nodes before each node
+    cost = indptr * ENTRY_BYTES + np.asarray(offsets[indptr]) * PROBABILITY_BYTES
+    bounds = [0]
+    while bounds[-1] < n:
+        a = bounds[-1]
+        b = int(np.searchsorted(cost, cost[a] + memory, side='right')) - 1
+        if b <= a:
+            raise ValueError('Row {} of the supergraph alone takes {:.2f} GB, more than the {:.2f} GB available for '
+                             'the walks: raise MEMORY_LIMIT or remove the hub (see train.py --plan)'.format(
+                                 a, (cost[a + 1] - cost[a]) / 1024 ** 3, memory / 1024 ** 3))
+        bounds.append(b)
+    return np.array(bounds)
+
+
+def _uniform(seed, keys):
+    """Uniform numbers in [0, 1) that only depend on the seed and the keys (splitmix64)."""
+    z = keys * np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed * 0xBF58476D1CE4E5B9 % 2 ** 64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def _load_partition(tables, indptr, a, b, copy):
+    lo, hi = int(indptr[a]), int(indptr[b])
+    take = np.array if copy else np.asarray
+    offsets = take(tables['offsets'][lo:hi + 1])
+    return {
+        'lo': lo,
+        'indices': take(tables['indices'][lo:hi]),
+        'reverse': take(tables['reverse'][lo:hi]),
+        'offsets': offsets - offsets[0],
+        'cdf': take(tables['cdf'][offsets[0]:offsets[-1]]),
+    }
+
+
+def _advance(part, indptr, walks, ids, cur, pos, step, seed):
+    """Move the walks ids (all standing on nodes of the partition) one step forward."""
+    v = cur[ids]
+    first = indptr[v] - part['lo'] # local position of the row of v
+    deg = indptr[v + 1] - indptr[v]
+    u = _uniform(seed, ids.astype(np.uint64) * np.uint64(walks.shape[1]) + step[ids].astype(np.uint64))
+
+    j = np.minimum((u * deg).astype(np.int64), deg - 1) # first step: uniform over the neighbours
+    later = pos[ids] >= 0
+    if later.any():
+        k = pos[ids[later]] - part['lo'] # entry of the previous node in the row of v
+        lo = part['offsets'][k]
+        j[later] = _search(part['cdf'], lo, part['offsets'][k + 1], u[later]) - lo
+
+    e = first + j
+    cur[ids] = part['indices'][e]
+    pos[ids] = part['reverse'][e]
+    walks[ids, step[ids]] = cur[ids]
+    step[ids] += 1
+
+
+def generate_walks(directory, num_walks, walk_length, seed, memory=None):
+    """
+    num_walks walks of walk_length nodes from every node, as rows of an int32 array of row numbers (see build_csr).
+    Every round starts one walk from each node, in a shuffled order.
+    memory: bytes of adjacency and transition tables to hold at a time (None: use the memory-mapped files directly).
+    """
+    tables = load_tables(directory)
+    indptr = np.array(tables['indptr'])
+    n = len(indptr) - 1
+    bounds = partitions(indptr, tables['offsets'], memory)
+    rng = np.random.default_rng(seed)
+
+    walks = np.empty((num_walks * n, walk_length), dtype=np.int32)
+    for r in range(num_walks):
+        walks[r * n:(r + 1) * n, 0] = rng.permutation(n)
+    cur = walks[:, 0].astype(np.int64)
+    pos = np.full(len(walks), -1, dtype=np.int64) # entry of the previous node in the row of the current one
+    step = np.ones(len(walks), dtype=np.int64) # next column to fill
+
+    active = np.flatnonzero(step < walk_length)
+    while len(active) != 0:
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            ids = active[(cur[active] >= a) & (cur[active] < b)]
+            if len(ids) == 0:
+                continue
+            part = _load_partition(tables, indptr, a, b, copy=memory is not None)
+            while len(ids) != 0:
+                _advance(part, indptr, walks, ids, cur, pos, step, seed)
+                ids = ids[(step[ids] < walk_length) & (cur[ids] >= a) & (cur[ids] < b)]
+            del part
+            active = active[step[active] < walk_length]
+    return walks
+
+
+class WalkCorpus:
+    """
+    Word2Vec corpus reading the walk shards from disk (memory-mapped) and yielding each walk as a list of node
+    labels (the vocabulary ids as strings), so the walks never have to be held in memory as Python lists.
+    """
+
+    def __init__(self, shards, names):
+        self.shards = shards
+        self.names = names # shared str objects, one per node
+
+    def __iter__(self):
+        names = self.names
+        for shard in self.shards:
+            walks = np.load(shard, mmap_mode='r')
+            for start in range(0, len(walks), 10000):
+                for walk in walks[start:start + 10000].tolist():
+                    yield [names[i] for i in walk]